@@ -1,34 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import logging
-import re
-import urllib
-from functools import reduce
 from pathlib import Path
-import requests
-from bs4 import BeautifulSoup
+import time
+import aiohttp
+import aioxmpp
 from spade import agent
-from spade.behaviour import CyclicBehaviour, OneShotBehaviour
+from spade.behaviour import CyclicBehaviour, OneShotBehaviour, PeriodicBehaviour
 from spade.message import Message
-from spade.template import Template
-from sqlalchemy.sql.expression import select, func
+from spade.template import ORTemplate, Template
+from sqlalchemy.sql.expression import select
 from app.exceptions import InitFailedException
+from .conversation_log_writer import ConversationLogWriter
+from .deadline import run_with_deadline
+from .file_maker import make_files, parse_file_specs
+from .gif_downloader import GifDownloader
+from .gif_store import GifStore
+from .fuzzy_matcher import FuzzyMatcher
+from .http_client import HttpClient
+from .intent_matcher import IntentMatcher
+from .joke_picker import JokePicker
 from .loaded_answers import loaded_answers as la
-from .const import API_KEYS_FILE, APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, ENVIRONMENT_FOLDER, \
-    DEFAULT_GIF_COUNT, MAX_GIF_COUNT, TIMEOUT_SECONDS, TRACEBACK_LOGGER_NAME
-from .database import db, BaseUrl, FunctionalityRegex, Joke
+from .metrics import serve_metrics, BEHAVIOUR_SECONDS, DEADLINES_EXCEEDED, \
+    FUZZY_MATCH_SECONDS, FUZZY_MATCHES, IN_FLIGHT_BEHAVIOURS, INTENT_MATCH_SECONDS, \
+    REJECTED_REQUESTS, REQUESTS, XMPP_MESSAGES_RECEIVED, XMPP_MESSAGES_SENT
+from .parse_pool import ParsePool
+from .person_extractor import extract_person_info
+from .person_info_cache import PersonInfoCache, normalize_name
+from .person_outcome import PersonOutcome
+from .rate_limiter import RateLimiter
+from .sessions import SessionStore
+from .single_flight import SingleFlight
+from .const import ADMISSION_QUEUE_SIZE, API_KEYS_FILE, APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, \
+    CONVERSATION_LOG_FLUSH_SECONDS, DEFAULT_BUDGET_SECONDS, ENVIRONMENT_FOLDER, \
+    DEFAULT_GIF_COUNT, FILE_IO_WORKERS, FUNCTIONALITY_BUDGET_SECONDS, FUZZY_RUN_MIN_SCORE, \
+    GIF_STORE_FOLDER, MAX_BATCH_FILES, MAX_COMMANDS_PER_MESSAGE, MAX_GIF_COUNT, \
+    MAX_CONCURRENT_REQUESTS, METRICS_HOSTNAME, METRICS_PORT, SESSION_EVICTION_PERIOD_SECONDS, \
+    TIMEOUT_SECONDS, TRACEBACK_LOGGER_NAME, WORKER_HEARTBEAT_SECONDS
+from .database import db, BaseUrl, FunctionalityExample, FunctionalityRegex
 from .functionality import Functionality
 
 logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
 traceback_logger = logging.getLogger(APP_LOGGER_NAME).getChild(TRACEBACK_LOGGER_NAME)
 
 class ChatbotAgent(agent.Agent):
-    def __init__(self, jid, password, user_address, verify_security=False):
+    def __init__(self, jid, password, verify_security=False, api_keys_file=API_KEYS_FILE,
+                    environment_folder=ENVIRONMENT_FOLDER, metrics_port=METRICS_PORT,
+                    dispatcher_jid=None, http_transport=None):
         super().__init__(jid, password, verify_security=verify_security)
-        self.user_address = user_address
+        self.environment_folder = environment_folder
+        self.metrics_port = metrics_port
+        # When working for a dispatcher, the requests it forwards are on behalf of its users
+        self.dispatcher_jid = str(aioxmpp.JID.fromstr(dispatcher_jid).bare()) \
+                                if dispatcher_jid is not None else None
+        self.sessions = SessionStore()
+        self.rate_limiter = RateLimiter()
+        # The outbound requests may be recorded or replayed by another transport
+        self.http_client = HttpClient(http_transport)
+        self.gif_store = GifStore(Path(environment_folder) / GIF_STORE_FOLDER,
+                                    GifDownloader(self.http_client))
+        self.person_info_cache = PersonInfoCache()
+        # Identical lookups made at the same time are done once
+        self.person_lookups = SingleFlight('person_info')
+        self.gif_lookups = SingleFlight('gifs')
+        self.joke_picker = JokePicker()
+        # Bounded, so a slow file system does not take the threads used by the rest
+        self.file_executor = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS,
+                                                thread_name_prefix='file-io')
+        self.parse_pool = ParsePool()
+        self.conversation_log = ConversationLogWriter()
 
         logger.debug('Loading API keys')
-        with open(API_KEYS_FILE, 'r', encoding='utf-8') as api_keys_file:
+        with open(api_keys_file, 'r', encoding='utf-8') as api_keys_file:
             api_keys = json.load(api_keys_file)
         self.gif_api_key = api_keys['tenor.com']
 
@@ -44,26 +89,124 @@ class ChatbotAgent(agent.Agent):
             self.search_people_url = search_people_url_result[0]
 
     async def setup(self):
-        template = Template()
-        template.set_metadata('performative', 'request')
-        template.set_metadata('language', 'chatbot-query')
-        self.add_behaviour(HandleRequestsBehaviour(), template)
-        self.add_behaviour(SendGreetingBehaviour())
-
-    async def send_response_message(self, behaviour, body,
-                    performative='inform', language='chatbot-response'):
-        message = Message(to=self.user_address)
+        await self.http_client.start()
+        await self.parse_pool.start()
+        await self.gif_store.start()
+
+        template_query = Template()
+        template_query.set_metadata('performative', 'request')
+        template_query.set_metadata('language', 'chatbot-query')
+        template_greeting = Template()
+        template_greeting.set_metadata('performative', 'request')
+        template_greeting.set_metadata('language', 'chatbot-greeting')
+        template = ORTemplate(template_query, template_greeting)
+        handle_requests_behaviour = HandleRequestsBehaviour()
+        self.add_behaviour(handle_requests_behaviour, template)
+        self.add_behaviour(DispatchRequestsBehaviour(handle_requests_behaviour))
+        self.add_behaviour(EvictIdleSessionsBehaviour(SESSION_EVICTION_PERIOD_SECONDS))
+        self.add_behaviour(FlushConversationLogBehaviour(CONVERSATION_LOG_FLUSH_SECONDS))
+        if self.dispatcher_jid is not None:
+            self.add_behaviour(SendHeartbeatsBehaviour(WORKER_HEARTBEAT_SECONDS))
+
+        if self.metrics_port is not None:
+            serve_metrics(self, METRICS_HOSTNAME, self.metrics_port)
+
+    async def _async_stop(self):
+        await super()._async_stop()
+        await self.http_client.close()
+        await self.joke_picker.close()
+        await self.conversation_log.close()
+        self.file_executor.shutdown(wait=False)
+        self.parse_pool.close()
+
+    # The sender, or the user the dispatcher forwarded the request for. The
+    # metadata is only trusted when it comes from the dispatcher
+    def get_session_key(self, message):
+        if self.is_dispatched(message):
+            return message.get_metadata('on-behalf-of')
+        return str(message.sender.bare())
+
+    # Whether the message was forwarded by the dispatcher of the worker
+    def is_dispatched(self, message):
+        return message.get_metadata('on-behalf-of') is not None and \
+            str(message.sender.bare()) == self.dispatcher_jid
+
+    # Responses are tagged with the thread of the request, so that clients can match them
+    @staticmethod
+    def make_response_message(request, body, performative, language):
+        message = Message(to=str(request.sender))
         message.set_metadata('performative',performative)
         message.set_metadata('language',language)
         message.body = body
-        logger.debug('Sending message to user agent: %s', str(message))
+        message.thread = request.thread
+        return message
+
+    async def log_request(self, request, received_at, functionality, performative):
+        await self.conversation_log.add({'created_at': datetime.utcnow(),
+            'sender': self.get_session_key(request), 'query': request.body,
+            'functionality': functionality, 'performative': performative,
+            'latency_seconds': time.perf_counter() - received_at})
+
+    async def send_response_message(self, behaviour, body,
+                    performative='inform', language='chatbot-response'):
+        if behaviour.performative is None:
+            behaviour.performative = performative
+        if behaviour.replies is not None:
+            behaviour.replies.append((performative, language, body))
+            return
+        message = self.make_response_message(behaviour.request, body, performative, language)
+        # Keep the responses to the same sender in order. The wait is done once the
+        # behaviour has run, so that it does not count towards its budget
+        if behaviour.outbox or not behaviour.is_previous_request_finished():
+            behaviour.outbox.append(message)
+            return
+        await self.send_message(behaviour, message)
+
+    async def send_message(self, behaviour, message):
+        logger.debug('Sending message to user agent: %s', message)
         await behaviour.send(message)
+        XMPP_MESSAGES_SENT.inc(message.get_metadata('performative'))
+
+# A message may have several commands, one per line
+def split_commands(body):
+    if body is None or '\n' not in body:
+        return [body]
+    return [line for line in body.splitlines() if line.strip()]
+
+# Tokens of the rate limit that a message costs, for the dispatcher, which enforces the
+# rate limit instead of its workers. The commands no regex matches cost a token each
+def get_request_cost(intent_matcher, message):
+    if message.get_metadata('language') == 'chatbot-greeting':
+        return SendGreetingBehaviour.cost
+    commands = split_commands(message.body)
+    if len(commands) > MAX_COMMANDS_PER_MESSAGE:
+        return TooManyCommandsBehaviour.cost
+    cost = 0
+    for command in commands:
+        match = None if command is None else intent_matcher.match(command)
+        if match is None:
+            cost += RequestBehaviour.cost
+        else:
+            functionality, groups = match
+            cost += HandleRequestsBehaviour.functionality_to_behaviour[functionality](groups).cost
+    return cost
+
+class FlushConversationLogBehaviour(PeriodicBehaviour):
+    async def run(self):
+        await self.agent.conversation_log.flush()
 
-class SendGreetingBehaviour(OneShotBehaviour):
+class EvictIdleSessionsBehaviour(PeriodicBehaviour):
     async def run(self):
-        self.agent: ChatbotAgent
-        await self.agent.send_response_message(self, la['BOT_GREETING'],
-            performative='inform', language='chatbot-greeting')
+        evicted = self.agent.sessions.evict_idle()
+        if evicted > 0:
+            logger.debug('Evicted %d idle sessions', evicted)
+
+class SendHeartbeatsBehaviour(PeriodicBehaviour):
+    async def run(self):
+        message = Message(to=self.agent.dispatcher_jid)
+        message.set_metadata('performative', 'inform')
+        message.set_metadata('language', 'chatbot-heartbeat')
+        await self.send(message)
 
 class HandleRequestsBehaviour(CyclicBehaviour):
     #  pylint: disable=unnecessary-lambda
@@ -76,6 +219,8 @@ class HandleRequestsBehaviour(CyclicBehaviour):
             (lambda groups: SearchPersonInfoBehaviour(groups)),
         Functionality.MAKE_FILE:
             (lambda groups: MakeFileBehaviour(groups)),
+        Functionality.MAKE_FILES:
+            (lambda groups: MakeFilesBehaviour(groups)),
         Functionality.DOWNLOAD_GIFS:
             (lambda groups: DownloadGifsBehaviour(groups)),
         Functionality.TELL_JOKE:
@@ -85,14 +230,24 @@ class HandleRequestsBehaviour(CyclicBehaviour):
     }
     #  pylint: enable=unnecessary-lambda
 
-    def __init__(self):
+    def __init__(self, max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+                    admission_queue_size=ADMISSION_QUEUE_SIZE):
         super().__init__()
+        self.request_slots = asyncio.Semaphore(max_concurrent_requests)
+        self.pending_requests = asyncio.Queue(admission_queue_size)
+        self.intent_matcher = None
+        self.fuzzy_matcher = None
+
+    async def on_start(self):
         logger.debug('Loading functionality regex from database')
-        with db.get_new_session() as session:
-            raw_functionality_regex = session.execute(
-                select(FunctionalityRegex.regex, FunctionalityRegex.functionality)).all()
-            self.functionality_regex = dict(map(lambda x: (re.compile(x[0], re.I), x[1]),
-                                                raw_functionality_regex))
+        async with db.get_new_async_session() as session:
+            raw_functionality_regex = (await session.execute(
+                select(FunctionalityRegex.regex, FunctionalityRegex.functionality,
+                        FunctionalityRegex.priority))).all()
+            raw_functionality_examples = (await session.execute(
+                select(FunctionalityExample.phrase, FunctionalityExample.functionality))).all()
+        self.intent_matcher = IntentMatcher(raw_functionality_regex)
+        self.fuzzy_matcher = FuzzyMatcher(raw_functionality_examples, raw_functionality_regex)
 
     async def run(self):
         logger.debug('Waiting for user request')
@@ -100,200 +255,479 @@ class HandleRequestsBehaviour(CyclicBehaviour):
         if message is None:
             logger.debug('Timeout exceeded while waiting for user request')
             return
-        logger.debug('Received user request: %s', str(message))
-        action = self.get_functionality_from_message(message.body)
-        self.agent.add_behaviour(action)
-        await action.join()
-
-    def get_functionality_from_message(self, message) -> OneShotBehaviour:
-        for regex, functionality in self.functionality_regex.items():
-            match = regex.match(message)
-            if match is not None:
-                logger.debug('Selected functionality %s', str(functionality))
-                return self.functionality_to_behaviour[functionality](match.groups())
+        received_at = time.perf_counter()
+        logger.debug('Received user request: %s', message)
+        XMPP_MESSAGES_RECEIVED.inc(message.get_metadata('language'))
+        if message.get_metadata('language') == 'chatbot-greeting':
+            action = SendGreetingBehaviour()
+            REQUESTS.inc('GREETING')
+        else:
+            commands = split_commands(message.body)
+            if len(commands) > MAX_COMMANDS_PER_MESSAGE:
+                action = TooManyCommandsBehaviour()
+            elif len(commands) > 1:
+                action = MultiCommandBehaviour([self.get_functionality_from_message(command)
+                                                for command in commands])
+            else:
+                action = self.get_functionality_from_message(message.body)
+        action.received_at = received_at
+
+        # Requests over the limits are rejected right away, without waiting for the previous
+        # requests of the sender. The rate limit of the forwarded ones is up to the dispatcher
+        if self.pending_requests.full():
+            await self.reject_request(action, message, 'SERVER_BUSY')
+        elif not self.agent.is_dispatched(message) and \
+                not self.agent.rate_limiter.try_acquire(self.agent.get_session_key(message),
+                                                        action.cost):
+            await self.reject_request(action, message, 'RATE_LIMITED')
+        else:
+            self.admit_request(action, message)
+
+    async def reject_request(self, action, message, reason):
+        logger.debug('Rejecting request from %s: %s', message.sender, reason)
+        REJECTED_REQUESTS.inc(reason)
+        response = self.agent.make_response_message(message, la[reason],
+                                                    'failure', 'chatbot-response')
+        await self.send(response)
+        XMPP_MESSAGES_SENT.inc('failure')
+        await self.agent.log_request(message, action.received_at, action.functionality,
+                                        'failure')
+
+    def admit_request(self, action, message):
+        session = self.agent.sessions.touch(self.agent.get_session_key(message))
+        action.request = message
+        action.dispatcher = self
+        action.previous_request = session.last_request
+        session.last_request = action
+        IN_FLIGHT_BEHAVIOURS.inc()
+        self.pending_requests.put_nowait(action)
+
+    def dispatch_request(self, action):
+        # The action does not receive messages, so use a template that matches none
+        self.agent.add_behaviour(action, ~Template())
+
+    def request_finished(self, action):
+        self.request_slots.release()
+        IN_FLIGHT_BEHAVIOURS.dec()
+        session = self.agent.sessions.get(self.agent.get_session_key(action.request))
+        if session is not None and session.last_request is action:
+            session.last_request = None
+
+    def get_functionality_from_message(self, message) -> 'RequestBehaviour':
+        with INTENT_MATCH_SECONDS.time():
+            match = self.intent_matcher.match(message)
+        if match is not None:
+            functionality, groups = match
+            logger.debug('Selected functionality %s', functionality)
+            REQUESTS.inc(functionality.name)
+            action = self.functionality_to_behaviour[functionality](groups)
+            action.functionality = functionality
+            return action
+        return self.get_closest_functionality(message)
+
+    # When no regex matches, the misspelled keywords of the message are corrected. If the
+    # regex of the closest functionality matches the result, it is run when the message is
+    # close enough to the examples, otherwise it is suggested. Failing that, the closest
+    # example is suggested
+    def get_closest_functionality(self, message) -> 'RequestBehaviour':
+        with FUZZY_MATCH_SECONDS.time():
+            fuzzy_match = self.fuzzy_matcher.match(message)
+            correction = None
+            if fuzzy_match is not None:
+                correction = fuzzy_match.correct(self.intent_matcher)
+
+        if correction is not None and fuzzy_match.score >= FUZZY_RUN_MIN_SCORE:
+            corrected, (functionality, groups, _) = correction
+            logger.debug('Selected functionality %s after correcting the message to %s',
+                            functionality, corrected)
+            FUZZY_MATCHES.inc('corrected')
+            REQUESTS.inc(functionality.name)
+            action = self.functionality_to_behaviour[functionality](groups)
+            action.functionality = functionality
+            return action
+        REQUESTS.inc('NOT_UNDERSTOOD')
+        if correction is not None:
+            FUZZY_MATCHES.inc('suggested')
+            return DidYouMeanBehaviour(correction[0])
+        if fuzzy_match is not None and fuzzy_match.suggestion is not None:
+            FUZZY_MATCHES.inc('suggested')
+            return DidYouMeanBehaviour(fuzzy_match.suggestion)
+        FUZZY_MATCHES.inc('none')
         return NotUnderstoodBehaviour()
 
-class SendFunctionalityBehaviour(OneShotBehaviour):
+# Starts the admitted requests as the running ones finish
+class DispatchRequestsBehaviour(CyclicBehaviour):
+    def __init__(self, handle_requests_behaviour):
+        super().__init__()
+        self.handle_requests_behaviour = handle_requests_behaviour
+
+    async def run(self):
+        action = await self.handle_requests_behaviour.pending_requests.get()
+        await self.handle_requests_behaviour.request_slots.acquire()
+        self.handle_requests_behaviour.dispatch_request(action)
+
+class RequestBehaviour(OneShotBehaviour):
+    # Tokens taken from the rate limit of the sender, roughly the outbound calls made
+    cost = 1
+    # Whether it must run after the other commands of a message
+    runs_alone = False
+    # Whether the conversation log must be written when it finishes
+    ends_session = False
+
+    def __init__(self):
+        super().__init__()
+        self.request = None
+        self.dispatcher = None
+        self.previous_request = None
+        self.finished = asyncio.Event()
+        self.start_time = None
+        # When set, the responses are collected instead of sent
+        self.replies = None
+        # For the conversation log
+        self.functionality = None
+        self.received_at = None
+        self.performative = None
+        # Responses waiting for the previous request of the sender to finish
+        self.outbox = []
+
+    # Seconds the behaviour may run before being cancelled
+    @property
+    def budget(self):
+        if self.functionality is None:
+            return DEFAULT_BUDGET_SECONDS
+        return FUNCTIONALITY_BUDGET_SECONDS.get(self.functionality.name, DEFAULT_BUDGET_SECONDS)
+
+    def is_previous_request_finished(self):
+        return self.previous_request is None or self.previous_request.finished.is_set()
+
+    async def wait_for_previous_request(self):
+        if self.previous_request is not None:
+            await self.previous_request.finished.wait()
+            self.previous_request = None
+
+    # Runs the behaviour, cancelling it if it takes longer than its budget. The outbound
+    # requests it makes are given the time left, so they are not waited for in vain
+    async def run_with_budget(self):
+        try:
+            await run_with_deadline(self.run(), self.budget)
+        except asyncio.TimeoutError:
+            logger.info('%s took longer than %s seconds', type(self).__name__, self.budget)
+            DEADLINES_EXCEEDED.inc(type(self).__name__)
+            if self.performative is None:
+                await self.agent.send_response_message(self, la['DEADLINE_EXCEEDED'],
+                                                        performative='failure')
+
+    # Called by SPADE instead of run
+    async def _run(self):
+        try:
+            await self.run_with_budget()
+        finally:
+            if self.outbox:
+                await self.wait_for_previous_request()
+                for message in self.outbox:
+                    await self.agent.send_message(self, message)
+                self.outbox.clear()
+
+    async def on_start(self):
+        self.start_time = time.perf_counter()
+
+    async def on_end(self):
+        BEHAVIOUR_SECONDS.observe(time.perf_counter() - self.start_time, type(self).__name__)
+        self.finished.set()
+        if self.dispatcher is not None:
+            self.dispatcher.request_finished(self)
+            await self.agent.log_request(self.request, self.received_at, self.functionality,
+                                            self.performative)
+        if self.ends_session:
+            await self.agent.conversation_log.flush()
+
+class SendGreetingBehaviour(RequestBehaviour):
+    async def run(self):
+        logger.debug('Sending greeting')
+        await self.agent.send_response_message(self, la['BOT_GREETING'],
+            performative='inform', language='chatbot-greeting')
+
+class SendFunctionalityBehaviour(RequestBehaviour):
     async def run(self):
         logger.debug('Sending functionality list')
         await self.agent.send_response_message(self, la['AVAILABLE_FUNCTIONALITY'])
 
-class ShowTimeBehaviour(OneShotBehaviour):
+class ShowTimeBehaviour(RequestBehaviour):
     async def run(self):
         logger.debug('Sending current time')
         await self.agent.send_response_message(self,
             la['SHOW_TIME_F'].format(time= datetime.now().strftime("%d-%m-%Y %H:%M:%S")))
 
-class SearchPersonInfoBehaviour(OneShotBehaviour):
+class SearchPersonInfoBehaviour(RequestBehaviour):
+    cost = 2
+
     def __init__(self, groups):
         super().__init__()
         self.name = groups[0]
 
     async def run(self):
-        logger.debug('Scrapping for information about %s', self.name)
-        res = requests.get(self.agent.search_people_url +
-            f'?search={urllib.parse.quote(self.name)}')
-        if res.status_code != 200:
-            logger.debug('Failed to reach server, code %s', res.status_code)
+        person_info = await self.agent.person_lookups.run(normalize_name(self.name),
+                                                            self.look_up_person)
+        if person_info is None:
             await self.agent.send_response_message(self,
                 la['NETWORK_ERROR'], performative='failure')
             return
-        html = BeautifulSoup(res.content, 'html.parser')
 
-        # Check whether the result is ambiguous
-        if html.find('div', {'id': 'disambigbox'}) is not None:
-            logger.debug('An ambiguous result was found')
+        outcome, summary = person_info
+        if outcome is PersonOutcome.FOUND:
+            await self.agent.send_response_message(self, summary)
+        elif outcome is PersonOutcome.AMBIGUOUS:
             await self.agent.send_response_message(self,
                 la['AMBIGUOUS_PERSON_F'].format(name=self.name), performative='failure')
-            return
+        else:
+            await self.agent.send_response_message(self,
+                la['NO_INFORMATION_PERSON_F'].format(name=self.name), performative='failure')
+
+    # Returns a (outcome, summary) tuple, or None if the server could not be reached
+    async def look_up_person(self):
+        cached = await self.agent.person_info_cache.get(self.name)
+        if cached is not None:
+            logger.debug('Using cached information about %s', self.name)
+            return cached
 
-        content_text = html.find('div', {'id': 'mw-content-text'})
-
-        # Use a more general id if the previous one stops working
-        if content_text is None:
-            logger.debug('Initial web scrapping strategy failed. Trying alternative strategy...')
-            content = html.find('div', {'id': 'bodyContent'})
-            content_text = reduce(lambda x, y: x if len(x.text) > len(y.text) else y,
-                                    content.children)
-
-        first_paragraph = next(filter(lambda x: len(x.text) > 5, content_text.find_all('p')))
-        if first_paragraph is not None:
-            logger.debug('There is a first paragraph in the page')
-            match = re.match(r'The page \".*\" does not exist\. You can ask for it to be created',
-                                first_paragraph.text.strip())
-            if match is None:
-                logger.debug('Cleaning text in the first paragraph')
-                await self.agent.send_response_message(self,
-                    re.sub(r'\[[^\[]*\]', '', first_paragraph.text).strip())
-                return
+        logger.debug('Scrapping for information about %s', self.name)
+        try:
+            res = await self.agent.http_client.get(self.agent.search_people_url,
+                params={'search': self.name}, hedge=True)
+        except aiohttp.ClientError:
+            logger.debug('Failed to reach server')
+            traceback_logger.debug('', exc_info=True)
+            return None
+        if res.status != 200:
+            logger.debug('Failed to reach server, code %s', res.status)
+            return None
+        # Only the page goes to the parsing process, and only the summary comes back
+        outcome, summary = await self.agent.parse_pool.run(extract_person_info, res.content)
+        await self.agent.person_info_cache.put(self.name, outcome, summary)
+        return outcome, summary
+
+# Runs the commands of a message, all at once except the ones which must run alone
+# (after the rest, in order), and answers with the result of every one of them
+class MultiCommandBehaviour(RequestBehaviour):
+    def __init__(self, commands):
+        super().__init__()
+        self.commands = commands
+
+    @property
+    def cost(self):
+        return sum(command.cost for command in self.commands)
+
+    @property
+    def budget(self):
+        return sum(command.budget for command in self.commands)
+
+    async def run(self):
+        concurrent = [command for command in self.commands if not command.runs_alone]
+        await asyncio.gather(*(self.run_command(command) for command in concurrent))
+        for command in self.commands:
+            if command.runs_alone:
+                await self.run_command(command)
+
+        lines = []
+        succeeded = 0
+        exit_requested = False
+        for index, command in enumerate(self.commands):
+            if command.replies:
+                performative, language, body = command.replies[0]
+            else:
+                performative, language, body = 'failure', 'chatbot-response', la['COMMAND_ERROR']
+            if language == 'chatbot-exit':
+                exit_requested = True
+                performative, body = 'inform', la['SESSION_CLOSED']
+            if performative == 'inform':
+                succeeded += 1
+            lines.append(la['COMMAND_RESULT_F'].format(index=index + 1, response=body,
+                status=la['COMMAND_OK'] if performative == 'inform' else la['COMMAND_FAILED']))
+        await self.agent.send_response_message(self, '\n'.join(lines),
+            performative='inform' if succeeded > 0 else 'failure')
+        if exit_requested:
+            self.ends_session = True
+            await self.agent.send_response_message(self, '',
+                performative='request', language='chatbot-exit')
+
+    async def run_command(self, command):
+        command.set_agent(self.agent)
+        command.request = self.request
+        command.replies = []
+        await command.on_start()
+        try:
+            await command.run_with_budget()
+        except Exception:
+            logger.info('Unexpected error in %s', type(command).__name__)
+            traceback_logger.info('', exc_info=True)
+        finally:
+            await command.on_end()
+
+class TooManyCommandsBehaviour(RequestBehaviour):
+    async def run(self):
         await self.agent.send_response_message(self,
-            la['NO_INFORMATION_PERSON_F'].format(name=self.name), performative='failure')
+            la['MAX_COMMANDS_F'].format(max_commands=MAX_COMMANDS_PER_MESSAGE),
+            performative='failure')
 
-class MakeFileBehaviour(OneShotBehaviour):
+def describe_make_file_result(result):
+    if result.error is not None:
+        return result.error.strerror or str(result.error)
+    return la[result.answer_id].format(name=result.name)
+
+class MakeFileBehaviour(RequestBehaviour):
     def __init__(self, groups):
         super().__init__()
         self.name = groups[0]
         self.file_contents = groups[1] if len(groups) > 1 else None
 
     async def run(self):
-        file = Path(f'{ENVIRONMENT_FOLDER}/{self.name}')
-        parent_folder = Path(ENVIRONMENT_FOLDER).resolve()
-        performative = 'failure'
+        loop = asyncio.get_running_loop()
+        result, = await loop.run_in_executor(self.agent.file_executor, make_files,
+                        self.agent.environment_folder, [(self.name, self.file_contents)])
+        if result.error is not None:
+            logger.info('Unexpected error: %s', result.error)
+            traceback_logger.info('', exc_info=result.error)
+        await self.agent.send_response_message(self, describe_make_file_result(result),
+            performative='inform' if result.is_success else 'failure')
+
+class MakeFilesBehaviour(RequestBehaviour):
+    def __init__(self, groups):
+        super().__init__()
+        self.files = parse_file_specs(groups[0])
 
-        try:
-            if Path(self.name).is_absolute(): # Check if input was an absolute path
-                message_body = la['ABSOLUTE_PATH_F'].format(name=self.name)
-            elif file.exists():
-                if file.is_file():
-                    message_body = la['FILE_EXISTS_F'].format(name=self.name)
-                elif file.exists() and file.is_dir():
-                    message_body = la['IS_FOLDER_F'].format(name=self.name)
-            elif not file.resolve().is_relative_to(parent_folder):
-                message_body = la['ACCESS_PARENT_ENVIRONMENT_F'].format(name=self.name)
-            else:
-                # Create empty file
-                logger.debug('No error found in the request')
-                file = file.resolve()
-
-                if not file.parent.exists():
-                    logger.debug('Creating parent folder containing the file')
-                    file.parent.mkdir(parents=True, exist_ok=True)
-
-                with file.open('w', encoding='utf-8') as file:
-                    if self.file_contents is not None:
-                        file.write(self.file_contents)
-                message_body = la['CREATE_FILE_SUCCESS_F'].format(name=self.name)
-                performative = 'inform'
-        except OSError as error:
-            logger.info('Unexpected error: %s', str(error))
-            traceback_logger.info('', stack_info=True)
-            message_body = error.strerror
-        await self.agent.send_response_message(self, message_body, performative=performative)
-
-class DownloadGifsBehaviour(OneShotBehaviour):
+    # One per file, the batches over the limit are rejected without writing anything
+    @property
+    def cost(self):
+        return max(1, len(self.files)) if len(self.files) <= MAX_BATCH_FILES else 1
+
+    async def run(self):
+        if len(self.files) > MAX_BATCH_FILES:
+            await self.agent.send_response_message(self,
+                la['MAX_BATCH_FILES_F'].format(max_files=MAX_BATCH_FILES), performative='failure')
+            return
+
+        logger.debug('Creating %d files', len(self.files))
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.agent.file_executor, make_files,
+                        self.agent.environment_folder, self.files)
+        for result in results:
+            if result.error is not None:
+                logger.info('Unexpected error: %s', result.error)
+        created = sum(1 for result in results if result.is_success)
+        await self.agent.send_response_message(self,
+            la['CREATE_FILES_RESULT_F'].format(created=created, total=len(results),
+                details='\n'.join(describe_make_file_result(result) for result in results)),
+            performative='inform' if created > 0 else 'failure')
+
+class DownloadGifsBehaviour(RequestBehaviour):
     def __init__(self, groups):
         super().__init__()
         self.gif_count = int(groups[0]) if groups[0].isdecimal() \
                          else DEFAULT_GIF_COUNT
         self.search_text = groups[1]
 
+    # The search and one download per gif
+    @property
+    def cost(self):
+        return 1 + self.gif_count if self.gif_count <= MAX_GIF_COUNT else 1
+
     async def run(self):
         if self.gif_count > MAX_GIF_COUNT:
             await self.agent.send_response_message(self,
                 la['MAX_GIF_COUNT'], performative='failure')
             return
 
-        res = requests.get(self.agent.search_gifs_url +
-                    f'?key={self.agent.gif_api_key}&q={self.search_text}&limit={self.gif_count}' +
-                    '&contentfilter=medium&media_filter=minimal')
-        if res.status_code != 200:
-            logger.debug('Failed to reach server, code %s', res.status_code)
+        stored = await self.agent.gif_lookups.run(
+            (' '.join(self.search_text.split()).casefold(), self.gif_count), self.store_gifs)
+        if stored is None:
             await self.agent.send_response_message(self,
                 la['NETWORK_ERROR'], performative='failure')
             return
 
-        results = res.json()['results']
-
-        if len(results) <= 0:
+        if len(stored) <= 0:
             await self.agent.send_response_message(self,
-                la['NO_RESULTS_F'].format(search_term=self.search_text), performative='failure')
+                la['NO_RESULTS_F'].format(search_text=self.search_text), performative='failure')
             return
 
         folder_name = ''.join(x if x.isalnum() or x in '-_.() ' else '_' for x in self.search_text)
-        result_urls = map(lambda result: result['media'][0]['gif']['url'], results)
-        for index, result_url in enumerate(result_urls):
-            res = requests.get(result_url, stream=True)
-
-            if res.status_code != 200:
-                await self.agent.send_response_message(self,
-                    la['NETWORK_ERROR'], performative='failure')
-                return
-
-            gif_path = Path(f'{ENVIRONMENT_FOLDER}/{folder_name}/{index+1}.gif').resolve()
-            if not gif_path.parent.exists():
-                logger.debug('Creating parent folder containing the file')
-                gif_path.parent.mkdir(parents=True, exist_ok=True)
-            with gif_path.open('wb') as gif_file:
-                logger.debug('Writing file in chunks')
-                for chunk in res.iter_content(chunk_size=1024):
-                    if chunk:
-                        gif_file.write(chunk)
+        folder = Path(f'{self.agent.environment_folder}/{folder_name}').resolve()
+        download_results = await self.agent.gif_store.link_all(stored,
+            [folder / f'{index+1}.gif' for index in range(len(stored))])
 
-        await self.agent.send_response_message(self,
-            la['DOWNLOAD_GIFS_SUCCESS_F'].format(search_text=self.search_text))
+        failed = [result.path.name for result in download_results if not result.is_success]
+        if len(failed) == len(download_results):
+            await self.agent.send_response_message(self,
+                la['NETWORK_ERROR'], performative='failure')
+        elif failed:
+            await self.agent.send_response_message(self,
+                la['DOWNLOAD_GIFS_PARTIAL_F'].format(search_text=self.search_text,
+                    downloaded=len(download_results) - len(failed), total=len(download_results),
+                    failed=', '.join(failed)))
+        else:
+            await self.agent.send_response_message(self,
+                la['DOWNLOAD_GIFS_SUCCESS_F'].format(search_text=self.search_text))
 
-class TellJokeBehaviour(OneShotBehaviour):
+    # Searches the gifs and stores them, returns None if the server could not be reached
+    async def store_gifs(self):
+        try:
+            res = await self.agent.http_client.get(self.agent.search_gifs_url,
+                        params={'key': self.agent.gif_api_key, 'q': self.search_text,
+                                'limit': str(self.gif_count), 'contentfilter': 'medium',
+                                'media_filter': 'minimal'}, hedge=True)
+        except aiohttp.ClientError:
+            logger.debug('Failed to reach server')
+            traceback_logger.debug('', exc_info=True)
+            return None
+        if res.status != 200:
+            logger.debug('Failed to reach server, code %s', res.status)
+            return None
+
+        items = []
+        for result in res.json()['results']:
+            url = result['media'][0]['gif']['url']
+            items.append((GifStore.get_gif_id(result, url), url))
+        logger.debug('Fetching %d gifs', len(items))
+        return await self.agent.gif_store.store_all(items)
+
+class TellJokeBehaviour(RequestBehaviour):
     def __init__(self, groups):
         super().__init__()
         self.is_new = groups[0] is not None
 
     async def run(self):
-        stmt = select(Joke).order_by(func.random()).limit(1)
         if self.is_new:
-            logger.debug('Filtering only new jokes')
-            stmt = stmt.where(Joke.is_new)
+            logger.debug('Picking a new joke')
+            joke = await self.agent.joke_picker.pick_new()
+        else:
+            joke = await self.agent.joke_picker.pick_any()
+
+        if joke is None:
+            error_message = la['ERROR_NO_NEW_JOKES'] if self.is_new else \
+                            la['ERROR_NO_JOKES']
+            await self.agent.send_response_message(self,error_message, performative='failure')
+        else:
+            await self.agent.send_response_message(self, joke)
+
+class SendExitBehaviour(RequestBehaviour):
+    runs_alone = True
+    ends_session = True
 
-        with db.get_new_session() as session:
-            joke_row = session.execute(stmt).first()
-
-            if joke_row is None:
-                error_message = la['ERROR_NO_NEW_JOKES'] if self.is_new else \
-                                la['ERROR_NO_JOKES']
-                await self.agent.send_response_message(self,error_message, performative='failure')
-            else:
-                joke = joke_row[0]
-                logger.debug('Marking joke as old in the database')
-                joke.is_new = False
-                session.commit()
-                await self.agent.send_response_message(self, joke.joke)
-
-class SendExitBehaviour(OneShotBehaviour):
     async def run(self):
         await self.agent.send_response_message(self, '',
             performative='request', language='chatbot-exit')
-        await self.agent.stop()
+        logger.debug('Closing the session of %s', self.request.sender)
+        self.agent.sessions.remove(self.agent.get_session_key(self.request))
 
-class NotUnderstoodBehaviour(OneShotBehaviour):
+class NotUnderstoodBehaviour(RequestBehaviour):
     async def run(self):
         await self.agent.send_response_message(self,
             la['MESSAGE_NOT_UNDERSTOOD'], performative='failure')
+
+class DidYouMeanBehaviour(RequestBehaviour):
+    def __init__(self, suggestion):
+        super().__init__()
+        self.suggestion = suggestion
+
+    async def run(self):
+        await self.agent.send_response_message(self,
+            la['DID_YOU_MEAN_F'].format(suggestion=self.suggestion), performative='failure')
@@ -1,5 +1,7 @@
 DEFAULT_LOG_FILE = '/opt/logs/logs.txt'
 CHATBOT_LOG_FILE = '/opt/logs/chatbot-logs.txt'
+WORKER_LOG_FILE_F = '/opt/logs/worker-{index}-logs.txt'
+WORKER_CHATBOT_LOG_FILE_F = '/opt/logs/worker-{index}-chatbot-logs.txt'
 AGENT_CREDENTIALS_FILE = 'app/credentials/agent_credentials.json'
 DB_CREDENTIALS_FILE = 'app/credentials/db_credentials.json'
 API_KEYS_FILE = 'app/credentials/api_keys.json'
@@ -13,3 +15,91 @@ TRACEBACK_LOGGER_NAME = 'traceback'
 TIMEOUT_SECONDS = 10000
 DEFAULT_GIF_COUNT = 5
 MAX_GIF_COUNT = 50
+MAX_CONCURRENT_REQUESTS = 16
+HTTP_POOL_SIZE = 100
+HTTP_POOL_SIZE_PER_HOST = 20
+HTTP_DNS_CACHE_SECONDS = 300
+HTTP_KEEPALIVE_SECONDS = 30
+# Upper limit of an outbound request when it has no deadline
+HTTP_TIMEOUT_SECONDS = 30
+# Idempotent requests are sent again if the first attempt takes longer than this
+# percentile of the recent requests to the host, once there are enough of them
+HTTP_HEDGING = True
+HTTP_HEDGE_PERCENTILE = 0.95
+HTTP_HEDGE_MIN_DELAY_SECONDS = 0.05
+HTTP_HEDGE_MIN_SAMPLES = 20
+HTTP_HEDGE_WINDOW_SIZE = 200
+# Query parameters left out of the recorded requests, since they hold secrets
+HTTP_ARCHIVE_IGNORED_PARAMS = ('key',)
+GIF_DOWNLOAD_CONCURRENCY = 10
+GIF_DOWNLOAD_RETRIES = 2
+GIF_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_SESSIONS = 10000
+SESSION_IDLE_SECONDS = 30 * 60
+SESSION_EVICTION_PERIOD_SECONDS = 60
+PERSON_CACHE_SIZE = 1024
+PERSON_CACHE_TTL_SECONDS = 24 * 60 * 60
+PERSON_CACHE_NEGATIVE_TTL_SECONDS = 60 * 60
+GIF_STORE_FOLDER = '.gifs'
+JOKE_BATCH_SIZE = 50
+JOKE_TOLD_FLUSH_SIZE = 50
+JOKE_ID_RANGE_TTL_SECONDS = 60
+JOKE_CLAIM_TTL_SECONDS = 10 * 60
+# Jokes imported with import_jokes.py per batch, each one is committed on its own
+JOKE_IMPORT_BATCH_SIZE = 10000
+# The conversation log is written in batches when this many rows are buffered, or
+# periodically. Requests wait when the buffer is full, until it is written
+CONVERSATION_LOG_FLUSH_SIZE = 200
+CONVERSATION_LOG_FLUSH_SECONDS = 5
+CONVERSATION_LOG_BUFFER_SIZE = 5000
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 20
+DB_POOL_PRE_PING = True
+DB_STATEMENT_TIMEOUT_MS = 5000
+METRICS_HOSTNAME = 'localhost'
+METRICS_PORT = 9464
+LOG_ASYNC = True
+LOG_JSON_LINES = False
+LOG_QUEUE_SIZE = 10000
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Fraction of the debug records kept, per logger (and its children)
+LOG_DEBUG_SAMPLE_RATES = {'aioxmpp': 0.1, 'spade': 0.1}
+RATE_LIMIT_TOKENS_PER_SECOND = 2
+RATE_LIMIT_BURST = 60
+RATE_LIMIT_MAX_SENDERS = 10000
+ADMISSION_QUEUE_SIZE = 512
+FILE_IO_WORKERS = 4
+FILE_WRITE_CHUNK_SIZE = 64 * 1024
+MAX_BATCH_FILES = 100
+MAX_COMMANDS_PER_MESSAGE = 20
+# Similarity of the closest example phrase needed to suggest it, and of the closest
+# word of its functionality needed to replace a misspelled word of the message
+FUZZY_MIN_SCORE = 0.4
+FUZZY_WORD_MIN_SCORE = 0.3
+# Similarity needed to run a corrected message without asking, below it the corrected
+# message is only suggested
+FUZZY_RUN_MIN_SCORE = 0.5
+# Seconds a request may take, per functionality, before it is cancelled and answered
+# with a failure. Several commands at once have the sum of their budgets
+DEFAULT_BUDGET_SECONDS = 10
+FUNCTIONALITY_BUDGET_SECONDS = {
+    'SEARCH_PERSON_INFO': 15,
+    'MAKE_FILE': 10,
+    'MAKE_FILES': 30,
+    'DOWNLOAD_GIFS': 60,
+    'TELL_JOKE': 5,
+}
+# Processes parsing the pages, with 0 they are parsed in the event loop
+PARSE_PROCESSES = 2
+# Imported by the parsing processes as soon as they start
+PARSE_PRELOADED_MODULES = ('app.person_extractor',)
+DISPATCHER_LOGGER_NAME = 'dispatcher'
+# How the dispatcher chooses a worker: 'least-in-flight' or 'functionality'
+DISPATCHER_BALANCING = 'least-in-flight'
+DISPATCHER_ROUTE_TTL_SECONDS = 60
+DISPATCHER_REQUEST_TIMEOUT_SECONDS = 300
+WORKER_HEARTBEAT_SECONDS = 5
+WORKER_HEARTBEAT_TIMEOUT_SECONDS = 15
+# How long to wait for the workers to send their first heartbeat
+WORKER_STARTUP_SECONDS = 10
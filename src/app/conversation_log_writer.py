@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from sqlalchemy import insert
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, CONVERSATION_LOG_BUFFER_SIZE, \
+    CONVERSATION_LOG_FLUSH_SIZE, TRACEBACK_LOGGER_NAME
+from .database import db, ConversationLog
+from .metrics import CONVERSATION_LOG_ROWS_DROPPED, CONVERSATION_LOG_ROWS_WRITTEN
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+traceback_logger = logging.getLogger(APP_LOGGER_NAME).getChild(TRACEBACK_LOGGER_NAME)
+
+# Keeps the rows of the conversation log in memory and inserts them in batches, when
+# enough of them are buffered or when flush is called. When the buffer is full, adding
+# a row waits until it is written, so the requests are slowed down instead of using
+# more memory. If the database fails, the batch is dropped
+class ConversationLogWriter:
+    def __init__(self, flush_size=CONVERSATION_LOG_FLUSH_SIZE,
+                    buffer_size=CONVERSATION_LOG_BUFFER_SIZE):
+        self.flush_size = flush_size
+        self.buffer_size = buffer_size
+        self._rows = []
+        self._flush_task = None
+        # Created in the event loop where the writer is used
+        self._flush_lock = None
+
+    async def add(self, row):
+        while len(self._rows) >= self.buffer_size:
+            await self.flush()
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_size and \
+                (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    # Writes the buffered rows, one batch at a time
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._rows:
+                return
+            rows, self._rows = self._rows, []
+            try:
+                async with db.get_new_async_session() as session:
+                    await session.execute(insert(ConversationLog), rows)
+                    await session.commit()
+            except Exception:
+                logger.warning('Dropped %d rows of the conversation log', len(rows))
+                traceback_logger.warning('', exc_info=True)
+                CONVERSATION_LOG_ROWS_DROPPED.inc(amount=len(rows))
+                return
+            CONVERSATION_LOG_ROWS_WRITTEN.inc(amount=len(rows))
+
+    async def close(self):
+        await self.flush()
@@ -2,5 +2,9 @@
 from .database import db
 from .base_url import BaseUrl
 from .functionality_regex import FunctionalityRegex
+from .functionality_example import FunctionalityExample
 from .joke import Joke
 from .answer import Answer
+from .conversation_log import ConversationLog
+from .person_info import PersonInfo
+from .seed_version import SeedVersion
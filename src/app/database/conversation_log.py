@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Enum, Float, Index, Integer, String
+from app.functionality import Functionality
+from .base import Base
+
+# A request received by the chatbot and how it was answered
+class ConversationLog(Base):
+    __tablename__ = "conversation_log"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+    sender = Column(String, nullable=False)
+    query = Column(String, nullable=True)
+    # None if the request was a greeting, several commands or not understood
+    functionality = Column(Enum(Functionality), nullable=True)
+    performative = Column(String, nullable=True)
+    # From the moment the request was received until it was answered
+    latency_seconds = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_conversation_log_sender_created_at', sender, created_at),
+    )
+
+    def __repr__(self) -> str:
+        return f'ConversationLog(sender={self.sender!r}, query={self.query!r}, ' + \
+            f'functionality={self.functionality!r})'
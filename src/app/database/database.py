@@ -1,65 +1,83 @@
 import json
-from sqlalchemy import create_engine
-from sqlalchemy.exc import IntegrityError
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
-from app.const import DB_CREDENTIALS_FILE
-from .default_data import get_answers, get_default_base_urls, \
-    get_default_functionality_regex, get_default_jokes
+from app.const import DB_CREDENTIALS_FILE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_SIZE, \
+    DB_STATEMENT_TIMEOUT_MS
+from app.metrics import DB_QUERY_SECONDS
 from .base import Base
-from .answer import Answer
-from .functionality_regex import FunctionalityRegex
-from .base_url import BaseUrl
-from .joke import Joke
+from .seeding import seed_database
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
 
 class Database:
     def __init__(self) -> None:
         self.engine = None
+        self.async_engine = None
         self.base = Base
 
-    def initialize_connection(self):
-        with open(DB_CREDENTIALS_FILE, 'r', encoding='utf-8') as db_credentials_file:
-            db_creedentials = json.load(db_credentials_file)
-        connection_url = ('postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}' + \
-            ':{POSTGRES_PORT}/{POSTGRES_DB}').format(**db_creedentials)
+    # The connection URL is read from the credentials file when not given. Besides
+    # PostgreSQL, SQLite URLs are accepted, in which case the pool options are ignored.
+    # The schema is created by seed_data
+    def initialize_connection(self, connection_url=None, pool_size=DB_POOL_SIZE,
+                                max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=DB_POOL_PRE_PING,
+                                statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS):
+        if connection_url is None:
+            connection_url = get_connection_url()
+        url = make_url(connection_url)
+        backend = url.get_backend_name()
+
+        options = {}
+        sync_connect_args = {}
+        async_connect_args = {}
+        if backend != 'sqlite':
+            options = {'pool_size': pool_size, 'max_overflow': max_overflow,
+                        'pool_pre_ping': pool_pre_ping}
+        if backend == 'postgresql':
+            sync_connect_args = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+            async_connect_args = {'server_settings':
+                                    {'statement_timeout': str(statement_timeout_ms)}}
 
-        self.engine = create_engine(connection_url, future=True)
-        self.base.metadata.create_all(self.engine, checkfirst=True)
+        self.engine = create_engine(url, future=True, connect_args=sync_connect_args, **options)
+        self.async_engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]),
+                                                connect_args=async_connect_args, **options)
+        instrument_engine(self.engine)
+        instrument_engine(self.async_engine.sync_engine)
 
-    # Seeds default data to the database
-    # When there is an error it means the data already existed and
-    # the transaction is rolled back
+    # Migrates the schema and seeds the default data, skipping what is up to date
     def seed_data(self):
-        with self.get_new_session() as session:
-            session: Session # Type notation
-            # Seed base urls
-            try:
-                session.bulk_insert_mappings(BaseUrl, get_default_base_urls())
-                session.commit()
-            except IntegrityError:
-                session.rollback()
+        seed_database(self.engine, self.base.metadata)
+
+    def get_new_session(self):
+        return Session(self.engine)
 
-            # Seed functionality to regex
-            try:
-                session.bulk_insert_mappings(FunctionalityRegex, get_default_functionality_regex())
-                session.commit()
-            except IntegrityError:
-                session.rollback()
+    # Sessions to be used from the event loop, so the queries do not block it
+    def get_new_async_session(self):
+        return AsyncSession(self.async_engine)
 
-            # Seed answers
-            try:
-                session.bulk_insert_mappings(Answer, get_answers())
-                session.commit()
-            except IntegrityError:
-                session.rollback()
+# Times every statement executed through the engine
+def instrument_engine(engine):
+    def before_cursor_execute(connection, *_):
+        connection.info.setdefault('query_start_times', []).append(time.perf_counter())
 
-            # Seed jokes
-            try:
-                session.bulk_insert_mappings(Joke, get_default_jokes())
-                session.commit()
-            except IntegrityError:
-                session.rollback()
+    def after_cursor_execute(connection, *_):
+        DB_QUERY_SECONDS.observe(time.perf_counter() -
+                                    connection.info['query_start_times'].pop())
 
-    def get_new_session(self):
-        return Session(self.engine)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+def get_connection_url():
+    with open(DB_CREDENTIALS_FILE, 'r', encoding='utf-8') as db_credentials_file:
+        db_creedentials = json.load(db_credentials_file)
+    if 'DATABASE_URL' in db_creedentials:
+        return db_creedentials['DATABASE_URL']
+    return ('postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}' + \
+        ':{POSTGRES_PORT}/{POSTGRES_DB}').format(**db_creedentials)
 
 db = Database()
@@ -18,6 +18,8 @@ def get_default_functionality_regex():
         {'regex':
             r'\s*(?:create|make)\s+file\s+(?:named\s+)?\'(.+?)\'(?:\s+containing\s+\'(.+?)\')?\s*$',
             'functionality': Functionality.MAKE_FILE},
+        {'regex': r'\s*(?:create|make)\s+files\s+(\'.+\')\s*$',
+            'functionality': Functionality.MAKE_FILES},
         {'regex': r'\s*download\s+(\d+|some)\s+gifs\s+(?:about|of)\s+(\S.*)\s*$',
             'functionality': Functionality.DOWNLOAD_GIFS},
         {'regex': r'\s*tell\s+(?:me\s+)?a\s+(new\s+)?joke\s*$',
@@ -26,6 +28,27 @@ def get_default_functionality_regex():
             'functionality': Functionality.SEND_EXIT},
     ]
 
+# The first example of each functionality is the one suggested when the message looks
+# like the text of its regex. All of them must be matched by the regex
+def get_default_functionality_examples():
+    examples = {
+        Functionality.SEND_FUNCTIONALITY: ['What can you do?', 'What can you do'],
+        Functionality.SHOW_TIME: ['Show me the time'],
+        Functionality.SEARCH_PERSON_INFO: ['Who is Barack Obama?', 'Who is Ada Lovelace?',
+            'Who is Alan Turing'],
+        Functionality.MAKE_FILE: ['Create file \'filename\'',
+            'Create file \'filename\' containing \'content\'',
+            'Make file named \'notes.txt\' containing \'hello\''],
+        Functionality.MAKE_FILES: ['Create files \'first\' containing \'content\', \'second\'',
+            'Make files \'a.txt\', \'b.txt\''],
+        Functionality.DOWNLOAD_GIFS: ['Download 10 gifs of potatoes',
+            'Download some gifs of potatoes', 'Download 5 gifs about cats'],
+        Functionality.TELL_JOKE: ['Tell me a joke', 'Tell me a new joke', 'Tell a joke'],
+        Functionality.SEND_EXIT: ['exit'],
+    }
+    return [{'phrase': phrase, 'functionality': functionality}
+            for functionality, phrases in examples.items() for phrase in phrases]
+
 def get_answers():
     return [
         # General
@@ -35,7 +58,23 @@ def get_answers():
         {'id': 'BOT_GREETING', 'text': 'Hi Human! What do you want?'},
         {'id': 'MESSAGE_NOT_UNDERSTOOD', 'text':
             'Message not understood. Try asking me \'What can you do?\''},
+        {'id': 'DID_YOU_MEAN_F', 'text': 'Message not understood. Did you mean \'{suggestion}\'?'},
         {'id': 'NETWORK_ERROR', 'text': 'An error ocurred while accesing the internet. Try later'},
+        {'id': 'RATE_LIMITED', 'text':
+            'You are sending too many requests. Wait a moment and try again'},
+        {'id': 'SERVER_BUSY', 'text': 'I am too busy right now. Try again later'},
+        {'id': 'WORKER_UNAVAILABLE', 'text':
+            'Your request was lost, since the server handling it stopped. Try again'},
+        {'id': 'DEADLINE_EXCEEDED', 'text':
+            'It took me too long to answer your request. Try again later'},
+
+        # Several commands
+        {'id': 'MAX_COMMANDS_F', 'text': 'Maximum number of commands at once is {max_commands}'},
+        {'id': 'COMMAND_RESULT_F', 'text': '{index}. [{status}] {response}'},
+        {'id': 'COMMAND_OK', 'text': 'ok'},
+        {'id': 'COMMAND_FAILED', 'text': 'failed'},
+        {'id': 'COMMAND_ERROR', 'text': 'An unexpected error ocurred'},
+        {'id': 'SESSION_CLOSED', 'text': 'Session closed'},
 
         # Available functionality
         {'id': 'AVAILABLE_FUNCTIONALITY', 'text': '''I can do the following things
@@ -43,8 +82,10 @@ def get_answers():
     Show you the time: Show me the time
     Look for information about someone: Who is Barack Obama?
     Create a file: Create file 'filename' /  Create file 'filename' containing 'content'
+    Create several files: Create files 'first' containing 'content', 'second'
     Download gifs: Download 10 gifs of potatoes /  Download some gifs of potatoes
     Tell a joke: Tell me a joke / Tell me a new joke 
+    Do several things at once: write one of the above per line
     End the execution: exit'''},
 
         # Show time
@@ -62,12 +103,16 @@ def get_answers():
         {'id': 'ACCESS_PARENT_ENVIRONMENT_F',
             'text': '\'{name}\' should not access the parent folder of environment'},
         {'id': 'CREATE_FILE_SUCCESS_F', 'text': 'Successfully created \'{name}\''},
+        {'id': 'MAX_BATCH_FILES_F', 'text': 'Maximum number of files at once is {max_files}'},
+        {'id': 'CREATE_FILES_RESULT_F', 'text': 'Created {created} of {total} files\n{details}'},
 
         # Download gifs
         {'id': 'MAX_GIF_COUNT', 'text': 'Maximum number of gifs is 50'},
         {'id': 'NO_RESULTS_F', 'text': 'No results were found about {search_text}'},
         {'id': 'DOWNLOAD_GIFS_SUCCESS_F', 'text':
             'Successfully downloaded gifs about \'{search_text}\''},
+        {'id': 'DOWNLOAD_GIFS_PARTIAL_F', 'text':
+            'Downloaded {downloaded} of {total} gifs about \'{search_text}\'. Failed: {failed}'},
 
         # Tell jokes
         {'id': 'ERROR_NO_JOKES', 'text': 'There are no jokes in the database'},
@@ -76,4 +121,12 @@ def get_answers():
 
 def get_default_jokes():
     with open(DEFAULT_JOKES_FILE, 'r', encoding='utf-8') as joke_file:
-        return map(lambda joke: {'joke': joke.strip()}, joke_file.readlines())
+        for line in joke_file:
+            joke = normalize_joke(line)
+            if joke:
+                yield {'joke': joke}
+
+# All the jokes are stored like this, so the same joke is not stored twice with different
+# spacing, whether it is seeded or imported
+def normalize_joke(line):
+    return ' '.join(line.split())
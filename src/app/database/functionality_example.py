@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Enum, String
+from app.functionality import Functionality
+from .base import Base
+
+# Phrases used to guess what the user meant when no regex matches the message
+class FunctionalityExample(Base):
+    __tablename__ = "functionality_example"
+
+    phrase = Column(String, primary_key=True)
+    functionality = Column(Enum(Functionality), nullable=False)
+
+    def __repr__(self) -> str:
+        return f'FunctionalityExample(phrase={self.phrase!r}, ' + \
+            f'functionality={self.functionality!r})'
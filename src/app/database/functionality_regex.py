@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Enum
+from sqlalchemy import Column, Integer, String, Enum
 from app.functionality import Functionality
 from .base import Base
 
@@ -7,6 +7,8 @@ class FunctionalityRegex(Base):
 
     regex = Column(String, primary_key=True)
     functionality = Column(Enum(Functionality), nullable=False)
+    # Patterns with higher priority are tried first
+    priority = Column(Integer, nullable=False, default=0)
 
     def __repr__(self) -> str:
         return f'FunctionalityRegex(regex={self.url!r}), functionality={self.functionality!r}'
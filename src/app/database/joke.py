@@ -1,12 +1,20 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, DateTime, Index, Integer, String
 from sqlalchemy.sql.sqltypes import Boolean
 from .base import Base
 
 class Joke(Base):
     __tablename__ = "joke"
 
-    joke = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    joke = Column(String, unique=True, nullable=False)
     is_new = Column(Boolean, default=True)
+    # New jokes claimed by a picker are not claimed by others until then
+    claimed_until = Column(DateTime, nullable=True)
+
+    # Only the new jokes are indexed, so looking for them does not scan the table
+    __table_args__ = (
+        Index('ix_joke_new_id', id, postgresql_where=is_new, sqlite_where=is_new),
+    )
 
     def __repr__(self) -> str:
         return f'Joke(joke={self.url!r})'
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, Enum, String
+from app.person_outcome import PersonOutcome
+from .base import Base
+
+class PersonInfo(Base):
+    __tablename__ = "person_info"
+
+    name = Column(String, primary_key=True)
+    outcome = Column(Enum(PersonOutcome), nullable=False)
+    summary = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'PersonInfo(name={self.name!r}, outcome={self.outcome!r})'
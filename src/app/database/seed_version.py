@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from .base import Base
+
+class SeedVersion(Base):
+    __tablename__ = "seed_version"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=True)
+    # Size and modification time of the source file, if any, so that the file
+    # does not have to be read to know whether it changed
+    source_stat = Column(String, nullable=True)
+    applied_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'SeedVersion(name={self.name!r}, version={self.version!r})'
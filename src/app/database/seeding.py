@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import delete, inspect, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.expression import select
+from app.const import APP_LOGGER_NAME, DEFAULT_JOKES_FILE, MAIN_LOGGER_NAME
+from app.functionality import Functionality
+from .default_data import get_answers, get_default_base_urls, \
+    get_default_functionality_examples, get_default_functionality_regex, get_default_jokes, \
+    normalize_joke
+from .answer import Answer
+from .base_url import BaseUrl
+from .functionality_example import FunctionalityExample
+from .functionality_regex import FunctionalityRegex
+from .joke import Joke
+from .seed_version import SeedVersion
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(MAIN_LOGGER_NAME)
+
+# Must be increased whenever a table is added or changed, and the changes
+# that create_all can not do must be added to migrate_schema
+SCHEMA_VERSION = 7
+SCHEMA_SEED_NAME = 'schema'
+SEED_BATCH_SIZE = 1000
+FILE_HASH_BLOCK_SIZE = 64 * 1024
+
+class SeedSet:
+    # The existing rows are only overwritten if update_existing is set
+    def __init__(self, name, model, get_rows, version=1, source_file=None,
+                    update_existing=False):
+        self.name = name
+        self.model = model
+        self.get_rows = get_rows
+        self.version = version
+        self.source_file = source_file
+        self.update_existing = update_existing
+
+    def get_source_stat(self):
+        if self.source_file is None:
+            return None
+        stat = os.stat(self.source_file)
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    def get_content_hash(self):
+        digest = hashlib.sha256()
+        if self.source_file is None:
+            digest.update(json.dumps(list(self.get_rows()), sort_keys=True, default=str)
+                            .encode('utf-8'))
+        else:
+            with open(self.source_file, 'rb') as source_file:
+                for block in iter(lambda: source_file.read(FILE_HASH_BLOCK_SIZE), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+SEED_SETS = [
+    SeedSet('base_url', BaseUrl, get_default_base_urls),
+    SeedSet('functionality_regex', FunctionalityRegex, get_default_functionality_regex),
+    SeedSet('functionality_example', FunctionalityExample, get_default_functionality_examples),
+    SeedSet('answer', Answer, get_answers, update_existing=True),
+    SeedSet('joke', Joke, get_default_jokes, source_file=DEFAULT_JOKES_FILE),
+]
+
+# Brings the schema up to date and seeds the default data which changed since the last
+# time. When nothing changed this costs a single query and the stat of the jokes file
+def seed_database(engine, metadata):
+    versions = get_seed_versions(engine)
+    schema_version = versions.get(SCHEMA_SEED_NAME)
+    if schema_version is None or schema_version.version < SCHEMA_VERSION:
+        logger.debug('Migrating the schema to version %d', SCHEMA_VERSION)
+        with engine.begin() as connection:
+            migrate_schema(connection, metadata)
+            save_seed_version(connection, SCHEMA_SEED_NAME, SCHEMA_VERSION)
+
+    for seed_set in SEED_SETS:
+        seed_version = versions.get(seed_set.name)
+        source_stat = seed_set.get_source_stat()
+        if seed_version is not None and seed_version.version == seed_set.version:
+            if source_stat is not None and seed_version.source_stat == source_stat:
+                continue
+            content_hash = seed_set.get_content_hash()
+            if seed_version.content_hash == content_hash:
+                if seed_version.source_stat != source_stat:
+                    # The file was touched, but its contents are the same
+                    with engine.begin() as connection:
+                        save_seed_version(connection, seed_set.name, seed_set.version,
+                                            content_hash, source_stat)
+                continue
+        else:
+            content_hash = seed_set.get_content_hash()
+
+        logger.debug('Seeding %s', seed_set.name)
+        with engine.begin() as connection:
+            if seed_set.update_existing:
+                upsert_rows(connection, seed_set.model, seed_set.get_rows())
+            else:
+                insert_ignoring_duplicates(connection, seed_set.model, seed_set.get_rows())
+            save_seed_version(connection, seed_set.name, seed_set.version,
+                                content_hash, source_stat)
+
+def get_seed_versions(engine):
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(select(SeedVersion.__table__)).all()
+    except DBAPIError:
+        # The table does not exist yet
+        return {}
+    return {row.name: row for row in rows}
+
+def save_seed_version(connection, name, version, content_hash=None, source_stat=None):
+    values = {'name': name, 'version': version, 'content_hash': content_hash,
+                'source_stat': source_stat, 'applied_at': datetime.utcnow()}
+    stmt = get_insert(connection, SeedVersion).values(values)
+    connection.execute(stmt.on_conflict_do_update(index_elements=[SeedVersion.name],
+                                                    set_=values))
+
+# Inserts the rows in batches, leaving out the ones which already exist
+def insert_ignoring_duplicates(connection, model, rows):
+    insert_batches(connection, get_insert(connection, model).on_conflict_do_nothing(), rows)
+
+# Inserts the rows in batches, overwriting the ones which already exist
+def upsert_rows(connection, model, rows):
+    stmt = get_insert(connection, model)
+    primary_key = [column.name for column in model.__table__.primary_key]
+    stmt = stmt.on_conflict_do_update(index_elements=primary_key,
+        set_={column.name: stmt.excluded[column.name] for column in model.__table__.columns
+                if column.name not in primary_key})
+    insert_batches(connection, stmt, rows)
+
+def insert_batches(connection, stmt, rows):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, SEED_BATCH_SIZE))
+        if not batch:
+            break
+        connection.execute(stmt, batch)
+
+def get_insert(connection, model):
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(model.__table__)
+    return sqlite.insert(model.__table__)
+
+def migrate_schema(connection, metadata):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    # Version 2: the jokes are identified by an integer
+    migrate_jokes = 'joke' in tables and \
+        'id' not in {column['name'] for column in inspector.get_columns('joke')}
+    if migrate_jokes:
+        connection.execute(text('CREATE TABLE joke_backup AS SELECT joke, is_new FROM joke'))
+        connection.execute(text('DROP TABLE joke'))
+
+    # Version 2: the functionality regex have a priority
+    if 'functionality_regex' in tables and 'priority' not in \
+            {column['name'] for column in inspector.get_columns('functionality_regex')}:
+        connection.execute(text('ALTER TABLE functionality_regex ' +
+                                'ADD COLUMN priority INTEGER NOT NULL DEFAULT 0'))
+
+    # Version 7: the new jokes are claimed until a time
+    if 'joke' in tables and not migrate_jokes and 'claimed_until' not in \
+            {column['name'] for column in inspector.get_columns('joke')}:
+        connection.execute(text('ALTER TABLE joke ADD COLUMN claimed_until TIMESTAMP'))
+
+    # Version 3: the functionality enum has new values. PostgreSQL keeps them in a
+    # type, which create_all does not update
+    if 'functionality_regex' in tables and connection.dialect.name == 'postgresql':
+        for functionality in Functionality:
+            connection.execute(text('ALTER TYPE functionality ADD VALUE IF NOT EXISTS ' +
+                                    f'\'{functionality.name}\''))
+
+    # Version 4: the functionality_example table is created by create_all
+    # Version 5: the conversation_log table is created by create_all
+    metadata.create_all(connection, checkfirst=True)
+
+    if migrate_jokes:
+        connection.execute(text('INSERT INTO joke (joke, is_new) ' +
+                                'SELECT joke, is_new FROM joke_backup'))
+        connection.execute(text('DROP TABLE joke_backup'))
+
+    # Version 6: the jokes are normalized like the imported ones
+    if 'joke' in tables:
+        normalize_jokes(connection)
+
+# The jokes which become the same as another one are merged into it, which is only marked
+# as new if both were
+def normalize_jokes(connection):
+    table = Joke.__table__
+    rows = connection.execution_options(stream_results=True) \
+        .execute(select(table.c.id, table.c.joke, table.c.is_new))
+    changed = [(row.id, normalize_joke(row.joke), row.is_new) for row in rows
+                if normalize_joke(row.joke) != row.joke]
+    for joke_id, joke, is_new in changed:
+        existing = connection.execute(select(table.c.id).where(table.c.joke == joke)).first()
+        if existing is None and joke:
+            connection.execute(update(table).where(table.c.id == joke_id).values(joke=joke))
+            continue
+        connection.execute(delete(table).where(table.c.id == joke_id))
+        if existing is not None and not is_new:
+            connection.execute(update(table).where(table.c.id == existing.id)
+                                .values(is_new=False))
@@ -0,0 +1,38 @@
+import asyncio
+import time
+from contextvars import ContextVar, copy_context
+
+_deadline = ContextVar('deadline', default=None)
+
+# Runs the coroutine until it finishes or the seconds pass, in which case it is cancelled
+# and asyncio.TimeoutError is raised. Meanwhile, the calls it makes can know the time
+# they have left with get_remaining. A deadline inside another one can not extend it
+async def run_with_deadline(coroutine, seconds):
+    deadline = time.monotonic() + seconds
+    outer_deadline = _deadline.get()
+    if outer_deadline is not None and outer_deadline < deadline:
+        deadline, seconds = outer_deadline, outer_deadline - time.monotonic()
+    # The task created by wait_for copies the context, so the deadline is seen by it
+    token = _deadline.set(deadline)
+    try:
+        return await asyncio.wait_for(coroutine, max(seconds, 0))
+    finally:
+        _deadline.reset(token)
+
+# Seconds left until the deadline, but no more than the limit. None if there is neither.
+# Raises asyncio.TimeoutError if the deadline has already passed
+def get_remaining(limit=None):
+    deadline = _deadline.get()
+    if deadline is None:
+        return limit
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError()
+    return remaining if limit is None else min(remaining, limit)
+
+# Starts a task for the coroutine with no deadline, for work shared by several callers,
+# each of which must wait for it no longer than its own deadline
+def ensure_future_without_deadline(coroutine):
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context.run(asyncio.ensure_future, coroutine)
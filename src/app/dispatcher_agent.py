@@ -0,0 +1,232 @@
+import logging
+import time
+from collections import OrderedDict
+from uuid import uuid4
+import zlib
+import aioxmpp
+from spade import agent
+from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
+from spade.message import Message
+from spade.template import ORTemplate, Template
+from sqlalchemy.sql.expression import select
+from .chatbot_agent import get_request_cost
+from .const import APP_LOGGER_NAME, DISPATCHER_BALANCING, DISPATCHER_LOGGER_NAME, \
+    DISPATCHER_REQUEST_TIMEOUT_SECONDS, DISPATCHER_ROUTE_TTL_SECONDS, METRICS_HOSTNAME, \
+    TIMEOUT_SECONDS, WORKER_HEARTBEAT_SECONDS, WORKER_HEARTBEAT_TIMEOUT_SECONDS
+from .database import db, FunctionalityRegex
+from .intent_matcher import IntentMatcher
+from .loaded_answers import loaded_answers as la
+from .metrics import serve_metrics, DISPATCHED_REQUESTS, HEALTHY_WORKERS, REJECTED_REQUESTS
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(DISPATCHER_LOGGER_NAME)
+
+BALANCING_LEAST_IN_FLIGHT = 'least-in-flight'
+BALANCING_FUNCTIONALITY = 'functionality'
+
+class Worker:
+    __slots__ = ('jid', 'in_flight', 'last_heartbeat')
+
+    def __init__(self, jid):
+        self.jid = jid
+        self.in_flight = 0
+        self.last_heartbeat = None
+
+    def is_healthy(self, now):
+        return self.last_heartbeat is not None and \
+            now - self.last_heartbeat < WORKER_HEARTBEAT_TIMEOUT_SECONDS
+
+# Where to send the responses to a forwarded request
+class Route:
+    __slots__ = ('sender', 'thread', 'worker', 'created', 'answered')
+
+    def __init__(self, sender, thread, worker):
+        self.sender = sender
+        self.thread = thread
+        self.worker = worker
+        self.created = time.monotonic()
+        self.answered = None
+
+# Receives the requests of the users and forwards them to the workers, which are chatbot
+# agents in this or other processes. The responses of the workers are sent back to the
+# users. The requests of a user go to the same worker while any of them is in progress,
+# so that the worker keeps its responses in order. The rate limit of the users is enforced
+# here, since their requests may go to any worker
+class DispatcherAgent(agent.Agent):
+    def __init__(self, jid, password, worker_jids, verify_security=False,
+                    balancing=DISPATCHER_BALANCING, metrics_port=None):
+        super().__init__(jid, password, verify_security=verify_security)
+        worker_jids = [str(aioxmpp.JID.fromstr(worker_jid).bare()) for worker_jid in worker_jids]
+        self.workers = {worker_jid: Worker(worker_jid) for worker_jid in worker_jids}
+        self.balancing = balancing
+        self.metrics_port = metrics_port
+        # Forwarded thread to route, in the order they were created
+        self.routes = OrderedDict()
+        # Sender to the worker handling its requests, and how many there are
+        self.sender_workers = {}
+        self.intent_matcher = None
+        self.rate_limiter = RateLimiter()
+        HEALTHY_WORKERS.set_function(function=self.count_healthy_workers)
+
+    async def setup(self):
+        # Used to find the cost of the requests, and their worker when balancing by functionality
+        logger.debug('Loading functionality regex from database')
+        async with db.get_new_async_session() as session:
+            raw_functionality_regex = (await session.execute(
+                select(FunctionalityRegex.regex, FunctionalityRegex.functionality,
+                        FunctionalityRegex.priority))).all()
+        self.intent_matcher = IntentMatcher(raw_functionality_regex)
+
+        template_query = Template()
+        template_query.set_metadata('performative', 'request')
+        template_query.set_metadata('language', 'chatbot-query')
+        template_greeting = Template()
+        template_greeting.set_metadata('performative', 'request')
+        template_greeting.set_metadata('language', 'chatbot-greeting')
+        self.add_behaviour(ForwardRequestsBehaviour(),
+                            ORTemplate(template_query, template_greeting))
+
+        template_heartbeat = Template()
+        template_heartbeat.set_metadata('performative', 'inform')
+        template_heartbeat.set_metadata('language', 'chatbot-heartbeat')
+        self.add_behaviour(ReceiveHeartbeatsBehaviour(), template_heartbeat)
+
+        template_response = Template()
+        template_response.set_metadata('language', 'chatbot-response')
+        template_greeting_response = Template()
+        template_greeting_response.set_metadata('performative', 'inform')
+        template_greeting_response.set_metadata('language', 'chatbot-greeting')
+        template_exit = Template()
+        template_exit.set_metadata('performative', 'request')
+        template_exit.set_metadata('language', 'chatbot-exit')
+        self.add_behaviour(RelayResponsesBehaviour(),
+            ORTemplate(ORTemplate(template_response, template_greeting_response), template_exit))
+
+        self.add_behaviour(CheckRoutesBehaviour(WORKER_HEARTBEAT_SECONDS))
+
+        if self.metrics_port is not None:
+            serve_metrics(self, METRICS_HOSTNAME, self.metrics_port)
+
+    def count_healthy_workers(self):
+        now = time.monotonic()
+        return sum(1 for worker in self.workers.values() if worker.is_healthy(now))
+
+    def choose_worker(self, sender, message):
+        now = time.monotonic()
+        sender_worker = self.sender_workers.get(sender)
+        if sender_worker is not None:
+            worker = self.workers[sender_worker[0]]
+            if worker.is_healthy(now):
+                return worker
+
+        healthy = [worker for worker in self.workers.values() if worker.is_healthy(now)]
+        if not healthy:
+            return None
+        if self.balancing == BALANCING_FUNCTIONALITY and \
+                message.get_metadata('language') == 'chatbot-query':
+            # Each functionality goes to the same worker, as long as the same ones are healthy.
+            # Several commands at once are grouped by the first one
+            match = self.intent_matcher.match((message.body or '').split('\n', 1)[0])
+            if match is not None:
+                return healthy[zlib.crc32(match[0].name.encode('utf-8')) % len(healthy)]
+        return min(healthy, key=lambda worker: worker.in_flight)
+
+    def add_route(self, thread, route):
+        self.routes[thread] = route
+        route.worker.in_flight += 1
+        sender_worker = self.sender_workers.get(route.sender)
+        if sender_worker is None or sender_worker[0] != route.worker.jid:
+            sender_worker = self.sender_workers[route.sender] = [route.worker.jid, 0]
+        sender_worker[1] += 1
+
+    # Called with the first response to the route
+    def finish_route(self, route):
+        route.answered = time.monotonic()
+        route.worker.in_flight -= 1
+        sender_worker = self.sender_workers.get(route.sender)
+        if sender_worker is not None and sender_worker[0] == route.worker.jid:
+            sender_worker[1] -= 1
+            if sender_worker[1] <= 0:
+                del self.sender_workers[route.sender]
+
+    @staticmethod
+    def make_message(to, thread, performative, language, body):
+        message = Message(to=to)
+        message.set_metadata('performative', performative)
+        message.set_metadata('language', language)
+        message.body = body
+        message.thread = thread
+        return message
+
+class ForwardRequestsBehaviour(CyclicBehaviour):
+    async def run(self):
+        message = await self.receive(TIMEOUT_SECONDS)
+        if message is None:
+            return
+        sender = str(message.sender.bare())
+        if not self.agent.rate_limiter.try_acquire(sender,
+                get_request_cost(self.agent.intent_matcher, message)):
+            logger.debug('Rejecting request from %s: RATE_LIMITED', sender)
+            REJECTED_REQUESTS.inc('RATE_LIMITED')
+            await self.send(self.agent.make_message(str(message.sender), message.thread,
+                            'failure', 'chatbot-response', la['RATE_LIMITED']))
+            return
+        worker = self.agent.choose_worker(sender, message)
+        if worker is None:
+            logger.warning('No healthy workers to handle the request of %s', sender)
+            await self.send(self.agent.make_message(str(message.sender), message.thread,
+                            'failure', 'chatbot-response', la['SERVER_BUSY']))
+            return
+
+        thread = uuid4().hex
+        self.agent.add_route(thread, Route(str(message.sender), message.thread, worker))
+        forwarded = self.agent.make_message(worker.jid, thread, 'request',
+                                            message.get_metadata('language'), message.body)
+        forwarded.set_metadata('on-behalf-of', sender)
+        logger.debug('Forwarding request of %s to %s', sender, worker.jid)
+        DISPATCHED_REQUESTS.inc(worker.jid)
+        await self.send(forwarded)
+
+class RelayResponsesBehaviour(CyclicBehaviour):
+    async def run(self):
+        message = await self.receive(TIMEOUT_SECONDS)
+        if message is None:
+            return
+        route = self.agent.routes.get(message.thread)
+        if route is None or str(message.sender.bare()) != route.worker.jid:
+            logger.debug('Ignoring response without a route: %s', message)
+            return
+        if route.answered is None:
+            self.agent.finish_route(route)
+        await self.send(self.agent.make_message(route.sender, route.thread,
+            message.get_metadata('performative'), message.get_metadata('language'), message.body))
+
+class ReceiveHeartbeatsBehaviour(CyclicBehaviour):
+    async def run(self):
+        message = await self.receive(TIMEOUT_SECONDS)
+        if message is None:
+            return
+        worker = self.agent.workers.get(str(message.sender.bare()))
+        if worker is None:
+            logger.debug('Ignoring heartbeat from unknown worker %s', message.sender)
+            return
+        if worker.last_heartbeat is None or not worker.is_healthy(time.monotonic()):
+            logger.info('Worker %s is available', worker.jid)
+        worker.last_heartbeat = time.monotonic()
+
+# Forgets the routes which were answered a while ago, and fails the requests which were
+# forwarded to workers that stopped sending heartbeats or that took too long
+class CheckRoutesBehaviour(PeriodicBehaviour):
+    async def run(self):
+        now = time.monotonic()
+        for thread, route in list(self.agent.routes.items()):
+            if route.answered is not None:
+                if now - route.answered > DISPATCHER_ROUTE_TTL_SECONDS:
+                    del self.agent.routes[thread]
+            elif not route.worker.is_healthy(now) or \
+                    now - route.created > DISPATCHER_REQUEST_TIMEOUT_SECONDS:
+                logger.warning('Request forwarded to %s was lost', route.worker.jid)
+                self.agent.finish_route(route)
+                del self.agent.routes[thread]
+                await self.send(self.agent.make_message(route.sender, route.thread,
+                    'failure', 'chatbot-response', la['WORKER_UNAVAILABLE']))
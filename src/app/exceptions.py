@@ -1,2 +1,10 @@
 class InitFailedException(Exception):
     pass
+
+class DownloadFailedException(Exception):
+    def __init__(self, status):
+        super().__init__(f'Unexpected status code {status}')
+        self.status = status
+
+class CallCancelledException(Exception):
+    pass
@@ -0,0 +1,95 @@
+import logging
+import os
+from pathlib import Path
+import re
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, FILE_WRITE_CHUNK_SIZE
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+
+# A file of a batch: 'name' or 'name' containing 'contents'
+FILE_SPEC_REGEX = re.compile(r'\'(.+?)\'(?:\s+containing\s+\'(.*?)\')?')
+
+# The functions of this module block on the file system, so they are run in a thread pool
+
+class MakeFileResult:
+    def __init__(self, name, answer_id=None, error=None):
+        self.name = name
+        self.answer_id = answer_id
+        self.error = error
+
+    @property
+    def is_success(self):
+        return self.answer_id == 'CREATE_FILE_SUCCESS_F'
+
+def parse_file_specs(text):
+    return [(name, contents or None) for name, contents in FILE_SPEC_REGEX.findall(text)]
+
+# Creates the files inside the environment folder, unless they already exist or are
+# outside of it. The contents of each file are synced before it is closed, and the new
+# folder entries with one fsync per folder, after all the files are written
+def make_files(environment_folder, files, chunk_size=FILE_WRITE_CHUNK_SIZE):
+    parent_folder = Path(environment_folder).resolve()
+    results = []
+    changed_folders = set()
+    for name, contents in files:
+        try:
+            answer_id, path = check_path(parent_folder, name)
+            if answer_id is None:
+                changed_folders.update(make_parent_folders(path))
+                write_file(path, contents, chunk_size)
+                changed_folders.add(path.parent)
+                answer_id = 'CREATE_FILE_SUCCESS_F'
+            results.append(MakeFileResult(name, answer_id))
+        except FileExistsError:
+            # Created since it was checked
+            results.append(MakeFileResult(name, 'FILE_EXISTS_F'))
+        except OSError as error:
+            results.append(MakeFileResult(name, error=error))
+
+    for folder in changed_folders:
+        fsync_folder(folder)
+    return results
+
+# Returns the id of the answer when the file can not be created, and its path otherwise
+def check_path(parent_folder, name):
+    file = parent_folder / name
+    if Path(name).is_absolute():
+        return 'ABSOLUTE_PATH_F', None
+    if file.exists():
+        return ('IS_FOLDER_F' if file.is_dir() else 'FILE_EXISTS_F'), None
+    path = file.resolve()
+    if not path.is_relative_to(parent_folder):
+        return 'ACCESS_PARENT_ENVIRONMENT_F', None
+    return None, path
+
+# Returns the folders where new folders were created
+def make_parent_folders(path):
+    missing = []
+    folder = path.parent
+    while not folder.exists():
+        missing.append(folder)
+        folder = folder.parent
+    if missing:
+        logger.debug('Creating parent folder containing the file')
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return [folder.parent for folder in missing]
+
+# The contents are encoded and written in chunks, so large ones are not copied at once
+def write_file(path, contents, chunk_size):
+    with path.open('xb') as file:
+        if contents is not None:
+            for start in range(0, len(contents), chunk_size):
+                file.write(contents[start:start + chunk_size].encode('utf-8'))
+        file.flush()
+        os.fsync(file.fileno())
+
+def fsync_folder(folder):
+    try:
+        descriptor = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    except OSError as error:
+        # Some file systems do not support syncing folders
+        logger.debug('Could not sync folder %s: %s', folder, error)
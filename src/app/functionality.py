@@ -5,6 +5,7 @@ class Functionality(Enum):
     SHOW_TIME = 'SHOW_TIME'
     SEARCH_PERSON_INFO = 'SEARCH_PERSON_INFO'
     MAKE_FILE = 'MAKE_FILE'
+    MAKE_FILES = 'MAKE_FILES'
     DOWNLOAD_GIFS = 'DOWNLOAD_GIFS'
     TELL_JOKE = 'TELL_JOKE'
     SEND_EXIT = 'SEND_EXIT'
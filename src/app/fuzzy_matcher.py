@@ -0,0 +1,214 @@
+import re
+from collections import Counter
+try:
+    from re import _parser as sre_parse
+except ImportError: # Python < 3.11
+    import sre_parse
+from .const import FUZZY_MIN_SCORE, FUZZY_WORD_MIN_SCORE
+
+NON_WORD_REGEX = re.compile(r'[\W_]+')
+WORD_REGEX = re.compile(r'[^\W_]+')
+QUOTED_REGEX = re.compile(r'\'[^\']*\'|"[^"]*"')
+NGRAM_SIZE = 3
+# Words shorter than this are never corrected, there are too many similar ones
+MIN_CORRECTED_WORD_LENGTH = 3
+
+class FuzzyMatch:
+    def __init__(self, functionality, suggestion, score, message, replacements):
+        self.functionality = functionality
+        # Example phrase closest to the message, or None if it is not close enough
+        self.suggestion = suggestion
+        self.score = score
+        self.message = message
+        # (start, end, word) tuples, with the span of each misspelled word of the
+        # message and the closest word in the regex of the functionality
+        self.replacements = replacements
+
+    # Returns the message with the replacements made, and the span of each new word
+    def apply(self, replacements):
+        parts = []
+        spans = []
+        position = 0
+        offset = 0
+        for start, end, word in replacements:
+            parts.append(self.message[position:start])
+            parts.append(word)
+            spans.append((start + offset, start + offset + len(word)))
+            offset += len(word) - (end - start)
+            position = end
+        parts.append(self.message[position:])
+        return ''.join(parts), spans
+
+    # Returns the corrected message and its match, a (functionality, groups, spans) tuple,
+    # if the regex of the functionality matches it, or None. The words that end up inside
+    # a captured group are left as they were, since that text is supplied by the user
+    def correct(self, intent_matcher):
+        replacements = self.replacements
+        while replacements:
+            corrected, spans = self.apply(replacements)
+            match = intent_matcher.match_spans(corrected)
+            if match is None or match[0] is not self.functionality:
+                return None
+            kept = [replacement for replacement, span in zip(replacements, spans)
+                    if not any(_overlap(span, group_span) for group_span in match[2])]
+            if len(kept) == len(replacements):
+                return corrected, match
+            replacements = kept
+        return None
+
+# Finds the closest intent for the messages that no regex matches, comparing the
+# character trigrams of the message with those of example phrases and of the literal
+# text of the regex. Both the phrases and their words are kept in inverted indexes,
+# so only the entries sharing some trigram with the message are ever scored
+class FuzzyMatcher:
+    # The examples are (phrase, functionality) tuples and the patterns
+    # (regex, functionality, priority) tuples
+    def __init__(self, examples, patterns=(), min_score=FUZZY_MIN_SCORE,
+                    word_min_score=FUZZY_WORD_MIN_SCORE):
+        self.min_score = min_score
+        self.word_min_score = word_min_score
+        self._entries = []
+        self._index = {}
+        self._words = []
+        self._word_ids = {}
+        self._word_index = {}
+        # Words used by each functionality, that misspelled words may be replaced with
+        self._vocabulary = {}
+
+        first_examples = {}
+        for phrase, functionality in examples:
+            first_examples.setdefault(functionality, phrase)
+            self._add_entry(normalize(phrase), phrase, functionality)
+        for regex, functionality, _ in patterns:
+            text = normalize(get_literal_text(regex))
+            if text:
+                self._add_entry(text, first_examples.get(functionality), functionality)
+            vocabulary = self._vocabulary.setdefault(functionality, set())
+            for word in get_literal_words(regex):
+                vocabulary.add(self._add_word(word))
+
+    def _add_entry(self, text, suggestion, functionality):
+        entry_id = len(self._entries)
+        ngrams = get_ngrams(text)
+        self._entries.append((functionality, suggestion, len(ngrams)))
+        for ngram in ngrams:
+            self._index.setdefault(ngram, []).append(entry_id)
+
+    def _add_word(self, word):
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self._words)
+            ngrams = get_ngrams(word)
+            self._words.append((word, len(ngrams)))
+            for ngram in ngrams:
+                self._word_index.setdefault(ngram, []).append(word_id)
+        return word_id
+
+    # Returns the closest FuzzyMatch, or None if no entry has anything in common with the
+    # message. Only the entries close enough are suggested, but the replacements of the
+    # words are found anyway, the regex decides whether the result is right
+    def match(self, message):
+        best = _find_closest(get_ngrams(normalize(message)), self._index, self._entries)
+        if best is None:
+            return None
+        entry_id, score = best
+        functionality, suggestion, _ = self._entries[entry_id]
+        return FuzzyMatch(functionality, suggestion if score >= self.min_score else None, score,
+                            message, self._find_replacements(message,
+                                self._vocabulary.get(functionality, set())))
+
+    # Only the words of the regex are used, so that the text supplied by the user, like
+    # names, is only replaced if it looks like one of them. Quoted text is never replaced
+    def _find_replacements(self, message, vocabulary):
+        quoted = [quoted_match.span() for quoted_match in QUOTED_REGEX.finditer(message)]
+        replacements = []
+        for word_match in WORD_REGEX.finditer(message):
+            word = word_match.group().casefold()
+            if len(word) < MIN_CORRECTED_WORD_LENGTH or self._word_ids.get(word) in vocabulary \
+                    or any(_overlap(word_match.span(), span) for span in quoted):
+                continue
+            best = _find_closest(get_ngrams(word), self._word_index, self._words,
+                                    lambda word_id: word_id in vocabulary)
+            if best is not None and best[1] >= self.word_min_score:
+                replacements.append((*word_match.span(), self._words[best[0]][0]))
+        return replacements
+
+def _overlap(span, other):
+    return span[0] < other[1] and other[0] < span[1]
+
+# Returns the id of the entry with the highest Jaccard similarity and the similarity,
+# or None if no entry shares a ngram. The last item of each entry is its ngram count
+def _find_closest(ngrams, index, entries, accept=None):
+    shared = Counter()
+    for ngram in ngrams:
+        postings = index.get(ngram)
+        if postings is not None:
+            shared.update(postings)
+    best = None
+    best_score = 0
+    for entry_id, count in shared.items():
+        score = count / (len(ngrams) + entries[entry_id][-1] - count)
+        if score > best_score and (accept is None or accept(entry_id)):
+            best, best_score = entry_id, score
+    return None if best is None else (best, best_score)
+
+def normalize(text):
+    return NON_WORD_REGEX.sub(' ', text.casefold()).strip()
+
+# Padded with spaces, so that the start and end of the words count
+def get_ngrams(text):
+    text = f' {text} '
+    return {text[index:index + NGRAM_SIZE] for index in range(len(text) - NGRAM_SIZE + 1)}
+
+# The text that every match of the regex contains, without the captured groups, which
+# are supplied by the user. Only the first alternative of each branch is kept
+def get_literal_text(regex):
+    try:
+        parsed = sre_parse.parse(regex, re.I)
+    except re.error:
+        return ''
+    parts = []
+    _collect_literal_text(parsed, parts)
+    return ''.join(parts)
+
+def _collect_literal_text(items, parts):
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            parts.append(chr(av))
+        elif op is sre_parse.IN or op is sre_parse.ANY:
+            parts.append(' ')
+        elif op is sre_parse.SUBPATTERN and av[0] is None:
+            _collect_literal_text(av[-1], parts)
+        elif op is sre_parse.BRANCH:
+            _collect_literal_text(av[1][0], parts)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] > 0:
+            _collect_literal_text(av[2], parts)
+
+# The words written literally anywhere in the regex, including every alternative
+def get_literal_words(regex):
+    try:
+        parsed = sre_parse.parse(regex, re.I)
+    except re.error:
+        return set()
+    words = set()
+    _collect_literal_words(parsed, words, [])
+    return words
+
+def _collect_literal_words(items, words, word):
+    for op, av in items:
+        if op is sre_parse.LITERAL and chr(av).isalnum():
+            word.append(chr(av).lower())
+            continue
+        if word:
+            words.add(''.join(word))
+            word.clear()
+        if op is sre_parse.SUBPATTERN:
+            _collect_literal_words(av[-1], words, word)
+        elif op is sre_parse.BRANCH:
+            for alternative in av[1]:
+                _collect_literal_words(alternative, words, word)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            _collect_literal_words(av[2], words, word)
+    if word:
+        words.add(''.join(word))
+        word.clear()
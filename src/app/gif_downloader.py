@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import logging
+import os
+from uuid import uuid4
+import aiohttp
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, GIF_DOWNLOAD_CHUNK_SIZE, \
+    GIF_DOWNLOAD_CONCURRENCY, GIF_DOWNLOAD_RETRIES
+from .exceptions import DownloadFailedException
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+
+# Status codes which are worth retrying, any other error status is final
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRY_DELAY_SECONDS = 0.25
+
+class GifDownloadResult:
+    def __init__(self, index, path, error=None, digest=None):
+        self.index = index
+        self.path = path
+        self.error = error
+        # SHA-256 of the contents of the file
+        self.digest = digest
+
+    @property
+    def is_success(self):
+        return self.error is None
+
+# Downloads several files at the same time, each one is streamed to a temporary
+# file that is renamed once it is complete, so a file is never left half-written
+class GifDownloader:
+    def __init__(self, http_client, concurrency=GIF_DOWNLOAD_CONCURRENCY,
+                    retries=GIF_DOWNLOAD_RETRIES, chunk_size=GIF_DOWNLOAD_CHUNK_SIZE):
+        self.http_client = http_client
+        self.concurrency = concurrency
+        self.retries = retries
+        self.chunk_size = chunk_size
+
+    async def download_all(self, urls_and_paths):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._download(semaphore, index, url, path)
+                                    for index, (url, path) in enumerate(urls_and_paths)))
+
+    async def _download(self, semaphore, index, url, path):
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    digest = await self._download_file(url, path)
+                    return GifDownloadResult(index, path, digest=digest)
+                except DownloadFailedException as error:
+                    logger.debug('Failed to download %s, code %s', url, error.status)
+                    if error.status not in RETRY_STATUS_CODES:
+                        return GifDownloadResult(index, path, error)
+                    last_error = error
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+                    logger.debug('Failed to download %s: %s', url, error)
+                    last_error = error
+                if attempt < self.retries:
+                    await asyncio.sleep(RETRY_DELAY_SECONDS * 2 ** attempt)
+            return GifDownloadResult(index, path, last_error)
+
+    async def _download_file(self, url, path):
+        loop = asyncio.get_running_loop()
+        async with self.http_client.stream(url) as res:
+            if res.status != 200:
+                raise DownloadFailedException(res.status)
+
+            await loop.run_in_executor(None, lambda: path.parent.mkdir(parents=True,
+                                                                        exist_ok=True))
+            temp_name = path.with_name(f'.{path.name}.{uuid4().hex}.part')
+            temp_file = await loop.run_in_executor(None, temp_name.open, 'xb')
+            digest = hashlib.sha256()
+            try:
+                with temp_file:
+                    async for chunk in res.content.iter_chunked(self.chunk_size):
+                        await loop.run_in_executor(None, _write_chunk, temp_file, digest, chunk)
+                await loop.run_in_executor(None, os.replace, temp_name, path)
+                return digest.hexdigest()
+            except BaseException:
+                await loop.run_in_executor(None, _remove_if_exists, temp_name)
+                raise
+
+def _write_chunk(file, digest, chunk):
+    digest.update(chunk)
+    file.write(chunk)
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from uuid import uuid4
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME
+from .gif_downloader import GifDownloadResult
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+
+GIF_ID_REGEX = re.compile(r'[\w-]+', re.ASCII)
+
+# Keeps a single copy of every gif, named after the hash of its contents, and an
+# index from the ids of the gifs to their hashes. The files requested by the users
+# are links to the stored copies, so gifs which are already stored are not downloaded
+class GifStore:
+    def __init__(self, root, downloader):
+        self.root = root
+        self.blobs_folder = root / 'blobs'
+        self.staging_folder = root / 'staging'
+        self.index_file = root / 'index.json'
+        self.downloader = downloader
+        self._index = None
+        self._save_lock = None
+
+    @staticmethod
+    def get_gif_id(result, url):
+        gif_id = str(result.get('id', ''))
+        if GIF_ID_REGEX.fullmatch(gif_id) is not None:
+            return gif_id
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def blob_path(self, digest):
+        return self.blobs_folder / digest[:2] / f'{digest}.gif'
+
+    # Loads the index, must be called from the event loop where the store will be used
+    async def start(self):
+        self._save_lock = asyncio.Lock()
+        self._index = await asyncio.get_running_loop().run_in_executor(None, self._load_index)
+
+    # Items are (gif id, url) tuples, the results have the paths of the blobs
+    async def store_all(self, items):
+        loop = asyncio.get_running_loop()
+        results = [None] * len(items)
+        downloads = []
+        for index, (gif_id, url) in enumerate(items):
+            digest = self._index.get(gif_id)
+            if digest is not None and \
+                    await loop.run_in_executor(None, self.blob_path(digest).exists):
+                results[index] = GifDownloadResult(index, self.blob_path(digest), digest=digest)
+            else:
+                downloads.append((index, gif_id, url))
+        logger.debug('%d gifs already stored, downloading %d', len(items) - len(downloads),
+                        len(downloads))
+
+        staging_paths = [self.staging_folder / f'{uuid4().hex}.gif' for _ in downloads]
+        download_results = await self.downloader.download_all(
+            [(url, staging_path) for (_, _, url), staging_path in zip(downloads, staging_paths)])
+        for (index, gif_id, _), result in zip(downloads, download_results):
+            if result.is_success:
+                await loop.run_in_executor(None, self._store_blob, result.path, result.digest)
+                self._index[gif_id] = result.digest
+                results[index] = GifDownloadResult(index, self.blob_path(result.digest),
+                                                    digest=result.digest)
+            else:
+                results[index] = GifDownloadResult(index, result.path, result.error)
+
+        if downloads:
+            async with self._save_lock:
+                await loop.run_in_executor(None, self._save_index, dict(self._index))
+        return results
+
+    # Links the stored gifs to their destinations, the results have the destination paths
+    async def link_all(self, stored, destinations):
+        results = []
+        for result, destination in zip(stored, destinations):
+            if result.is_success:
+                results.append(await self._link(result.index, result.digest, destination))
+            else:
+                results.append(GifDownloadResult(result.index, destination, result.error))
+        return results
+
+    async def _link(self, index, digest, destination):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._link_blob, self.blob_path(digest), destination)
+            return GifDownloadResult(index, destination, digest=digest)
+        except OSError as error:
+            logger.info('Could not link gif: %s', error)
+            return GifDownloadResult(index, destination, error)
+
+    def _store_blob(self, staging_path, digest):
+        blob_path = self.blob_path(digest)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        if blob_path.exists():
+            staging_path.unlink()
+        else:
+            os.replace(staging_path, blob_path)
+
+    # Replaces the destination with a hard link to the blob, or with a symbolic link if
+    # hard links are not supported, or with a copy as a last resort
+    @staticmethod
+    def _link_blob(blob_path, destination):
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = destination.with_name(f'.{destination.name}.{uuid4().hex}.link')
+        try:
+            os.link(blob_path, temp_path)
+        except OSError:
+            try:
+                os.symlink(os.path.relpath(blob_path, destination.parent), temp_path)
+            except OSError:
+                shutil.copyfile(blob_path, temp_path)
+        os.replace(temp_path, destination)
+        # Renaming a link over another link to the same file does nothing
+        if os.path.lexists(temp_path):
+            os.unlink(temp_path)
+
+    def _load_index(self):
+        self.staging_folder.mkdir(parents=True, exist_ok=True)
+        try:
+            with self.index_file.open('r', encoding='utf-8') as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return {}
+        except json.decoder.JSONDecodeError:
+            logger.warning('The index of the gif store is corrupted, it will be rebuilt')
+            return {}
+
+    def _save_index(self, index):
+        temp_path = self.index_file.with_name(f'.{self.index_file.name}.{uuid4().hex}')
+        with temp_path.open('w', encoding='utf-8') as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, self.index_file)
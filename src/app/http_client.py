@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from yarl import URL
+from .const import HTTP_HEDGE_MIN_DELAY_SECONDS, HTTP_HEDGE_MIN_SAMPLES, HTTP_HEDGE_PERCENTILE, \
+    HTTP_HEDGE_WINDOW_SIZE, HTTP_HEDGING, HTTP_TIMEOUT_SECONDS
+from .deadline import get_remaining
+from .http_transport import AiohttpTransport
+from .metrics import HEDGED_REQUESTS, HTTP_REQUEST_SECONDS
+
+class HttpResponse:
+    def __init__(self, status, content):
+        self.status = status
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+# Latencies of the last requests to each host
+class LatencyTracker:
+    def __init__(self, window_size=HTTP_HEDGE_WINDOW_SIZE, min_samples=HTTP_HEDGE_MIN_SAMPLES):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._latencies = {}
+
+    def add(self, host, seconds):
+        latencies = self._latencies.get(host)
+        if latencies is None:
+            latencies = self._latencies[host] = deque(maxlen=self.window_size)
+        latencies.append(seconds)
+
+    # None if there are not enough samples yet
+    def get_percentile(self, host, fraction):
+        latencies = self._latencies.get(host)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+# Shared HTTP client, the requests go through a transport, which by default keeps the
+# connections alive in a pool per host, and may also record or replay them. The requests
+# end by the deadline of the caller, if any
+class HttpClient:
+    def __init__(self, transport=None, hedging=HTTP_HEDGING):
+        self.transport = transport if transport is not None else AiohttpTransport()
+        self.hedging = hedging
+        self.latencies = LatencyTracker()
+
+    # Must be called from the event loop where the client will be used
+    async def start(self):
+        await self.transport.start()
+
+    async def close(self):
+        await self.transport.close()
+
+    # Only idempotent requests may be hedged
+    async def get(self, url, params=None, hedge=False) -> HttpResponse:
+        host = URL(url).host
+        if hedge and self.hedging:
+            status, content = await self._hedged_get(url, params, host)
+        else:
+            status, content = await self._timed_get(url, params, host)
+        return HttpResponse(status, content)
+
+    async def _timed_get(self, url, params, host):
+        start = time.perf_counter()
+        status, content = await self.transport.get(url, params,
+                                                    get_remaining(HTTP_TIMEOUT_SECONDS))
+        elapsed = time.perf_counter() - start
+        HTTP_REQUEST_SECONDS.observe(elapsed, host, status)
+        self.latencies.add(host, elapsed)
+        return status, content
+
+    # If the request takes longer than most, a second one is sent, and the first
+    # answer received is used. Tail latency is usually caused by a few stuck requests
+    async def _hedged_get(self, url, params, host):
+        delay = self.latencies.get_percentile(host, HTTP_HEDGE_PERCENTILE)
+        if delay is None:
+            return await self._timed_get(url, params, host)
+        delay = max(delay, HTTP_HEDGE_MIN_DELAY_SECONDS)
+        remaining = get_remaining()
+        if remaining is not None and delay >= remaining:
+            return await self._timed_get(url, params, host)
+
+        first = asyncio.ensure_future(self._timed_get(url, params, host))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.add(asyncio.ensure_future(self._timed_get(url, params, host)))
+            hedged = len(tasks) > 1
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            HEDGED_REQUESTS.inc(host, 'first' if task is first else 'second')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # Yields the response without reading the body, so it can be read in chunks.
+    # Only the time until the headers are received is measured
+    @asynccontextmanager
+    async def stream(self, url, params=None):
+        start = time.perf_counter()
+        async with self.transport.stream(url, params,
+                                            get_remaining(HTTP_TIMEOUT_SECONDS)) as response:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, URL(url).host,
+                                            response.status)
+            yield response
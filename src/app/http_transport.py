@@ -0,0 +1,223 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+from contextlib import asynccontextmanager
+from uuid import uuid4
+import aiohttp
+from yarl import URL
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, HTTP_ARCHIVE_IGNORED_PARAMS, \
+    HTTP_DNS_CACHE_SECONDS, HTTP_KEEPALIVE_SECONDS, HTTP_POOL_SIZE, HTTP_POOL_SIZE_PER_HOST
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+
+# Status of the responses which are not in the archive and of the injected errors
+NOT_RECORDED_STATUS = 504
+INJECTED_ERROR_STATUS = 503
+# Bodies are stored compressed only if that makes them this much smaller
+MIN_COMPRESSION_RATIO = 0.9
+
+# Sends the requests through a pool of connections per host, keeping them alive
+class AiohttpTransport:
+    def __init__(self, pool_size=HTTP_POOL_SIZE, pool_size_per_host=HTTP_POOL_SIZE_PER_HOST,
+                    dns_cache_seconds=HTTP_DNS_CACHE_SECONDS,
+                    keepalive_seconds=HTTP_KEEPALIVE_SECONDS):
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.dns_cache_seconds = dns_cache_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.session = None
+
+    # Must be called from the event loop where the transport will be used
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                        limit_per_host=self.pool_size_per_host,
+                                        use_dns_cache=True,
+                                        ttl_dns_cache=self.dns_cache_seconds,
+                                        keepalive_timeout=self.keepalive_seconds)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # Returns the status and the body. The timeout covers the whole request, in seconds
+    async def get(self, url, params=None, timeout=None):
+        async with self.session.get(url, params=params,
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return response.status, await response.read()
+
+    # Yields the response without reading the body, which has a status and a
+    # content with an iter_chunked method. The timeout includes reading the body
+    @asynccontextmanager
+    async def stream(self, url, params=None, timeout=None):
+        async with self.session.get(url, params=params,
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            yield response
+
+# Identifies a request in the archive. The parameters are sorted, and the ones with
+# secrets, like API keys, are left out so that they are not stored
+def get_request_key(url, params=None, ignored_params=HTTP_ARCHIVE_IGNORED_PARAMS):
+    url = URL(url)
+    query = list(url.query.items())
+    if params is not None:
+        query += list(params.items())
+    query = sorted((name, value) for name, value in query if name not in ignored_params)
+    return f'GET {url.with_query(query)}'
+
+# Responses stored in a folder: an index with a JSON line per request, and the bodies
+# named after the hash of their contents, so identical bodies are stored once. A request
+# recorded again is overwritten by the line appended last. Transports recording to the
+# same folder must share the archive, since it writes one response at a time
+class HttpArchive:
+    def __init__(self, folder):
+        self.folder = folder
+        self.index_file = os.path.join(folder, 'index.jsonl')
+        self.bodies_folder = os.path.join(folder, 'bodies')
+        self._save_lock = threading.Lock()
+
+    def load(self):
+        entries = {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as index_file:
+                for line in index_file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries[entry['key']] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def body_path(self, entry):
+        suffix = '.gz' if entry['compressed'] else ''
+        return os.path.join(self.bodies_folder, entry['digest'][:2], entry['digest'] + suffix)
+
+    def read_body(self, entry):
+        with open(self.body_path(entry), 'rb') as body_file:
+            body = body_file.read()
+        return gzip.decompress(body) if entry['compressed'] else body
+
+    def save(self, key, status, body):
+        compressed_body = gzip.compress(body)
+        entry = {'key': key, 'status': status, 'digest': hashlib.sha256(body).hexdigest(),
+                    'size': len(body),
+                    'compressed': len(compressed_body) < len(body) * MIN_COMPRESSION_RATIO}
+        path = self.body_path(entry)
+        with self._save_lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f'{path}.{uuid4().hex}.part'
+                with open(temp_path, 'wb') as body_file:
+                    body_file.write(compressed_body if entry['compressed'] else body)
+                os.replace(temp_path, path)
+            with open(self.index_file, 'a', encoding='utf-8') as index_file:
+                index_file.write(json.dumps(entry) + '\n')
+        return entry
+
+# Sends the requests through another transport, and stores the responses in an archive,
+# which is either a folder or an HttpArchive shared with other transports. Streamed bodies
+# are stored once they have been read completely
+class RecordingTransport:
+    def __init__(self, archive, transport=None):
+        self.archive = archive if isinstance(archive, HttpArchive) else HttpArchive(archive)
+        self.transport = transport if transport is not None else AiohttpTransport()
+
+    async def start(self):
+        await self.transport.start()
+        await asyncio.get_running_loop().run_in_executor(None,
+            lambda: os.makedirs(self.archive.folder, exist_ok=True))
+
+    async def close(self):
+        await self.transport.close()
+
+    async def get(self, url, params=None, timeout=None):
+        status, body = await self.transport.get(url, params, timeout)
+        await self._record(get_request_key(url, params), status, body)
+        return status, body
+
+    @asynccontextmanager
+    async def stream(self, url, params=None, timeout=None):
+        async with self.transport.stream(url, params, timeout) as response:
+            recorded = RecordedStream(response)
+            yield recorded
+            if recorded.is_complete:
+                await self._record(get_request_key(url, params), response.status,
+                                    b''.join(recorded.chunks))
+
+    async def _record(self, key, status, body):
+        await asyncio.get_running_loop().run_in_executor(None, self.archive.save,
+                                                            key, status, body)
+        logger.debug('Recorded %s', key)
+
+# Keeps the chunks of a streamed response while they are read
+class RecordedStream:
+    def __init__(self, response):
+        self.status = response.status
+        self.content = self
+        self.chunks = []
+        self.is_complete = False
+        self._response = response
+
+    async def iter_chunked(self, size):
+        async for chunk in self._response.content.iter_chunked(size):
+            self.chunks.append(chunk)
+            yield chunk
+        self.is_complete = True
+
+# Answers the requests with the responses in an archive, without using the network.
+# Latency and errors may be injected, the errors are responses with a retryable status
+class ReplayTransport:
+    def __init__(self, folder, latency_seconds=0, error_rate=0, seed=None):
+        self.archive = HttpArchive(folder)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.entries = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.entries = await loop.run_in_executor(None, self.archive.load)
+        logger.debug('Loaded %d recorded responses', len(self.entries))
+
+    async def close(self):
+        pass
+
+    async def get(self, url, params=None, timeout=None):
+        return await self._replay(url, params, timeout)
+
+    @asynccontextmanager
+    async def stream(self, url, params=None, timeout=None):
+        status, body = await self._replay(url, params, timeout)
+        yield ReplayedStream(status, body)
+
+    async def _replay(self, url, params, timeout):
+        if timeout is not None and self.latency_seconds > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        if self.latency_seconds > 0:
+            await asyncio.sleep(self.latency_seconds)
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            return INJECTED_ERROR_STATUS, b''
+        key = get_request_key(url, params)
+        entry = self.entries.get(key)
+        if entry is None:
+            logger.warning('No recorded response for %s', key)
+            return NOT_RECORDED_STATUS, b''
+        body = await asyncio.get_running_loop().run_in_executor(None,
+                                                                self.archive.read_body, entry)
+        return entry['status'], body
+
+class ReplayedStream:
+    def __init__(self, status, body):
+        self.status = status
+        self.content = self
+        self._body = body
+
+    async def iter_chunked(self, size):
+        for offset in range(0, len(self._body), size):
+            yield self._body[offset:offset + size]
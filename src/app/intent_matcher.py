@@ -0,0 +1,211 @@
+import re
+import warnings
+try:
+    from re import _parser as sre_parse
+except ImportError: # Python < 3.11
+    import sre_parse
+
+# Number of characters of the literal prefix used to index the patterns
+PREFIX_LENGTH = 3
+# Patterns fused in each regex. The regex engine saves and restores the captured groups
+# when it backtracks between alternatives, which costs more the more groups there are,
+# so very long alternations are slower than trying the patterns in turn
+MAX_FUSED_PATTERNS = 16
+
+REPEAT_OPS = tuple(getattr(sre_parse, name) for name in
+                    ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT') if hasattr(sre_parse, name))
+GROUP_REFERENCE_OPS = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+WHITESPACE = [(sre_parse.IN, [(sre_parse.CATEGORY, sre_parse.CATEGORY_SPACE)])]
+# The only characters which are not ASCII but match an ASCII letter when ignoring case,
+# and whose lowercase is not that letter
+PREFIX_FOLDING = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+# Matches a message against many regex at once.
+# The patterns are grouped by the literal text they must start with, and all the
+# patterns that may match a message are fused into a single alternation, tried in
+# order of priority. So a message is matched with one dictionary lookup and one regex
+# match, instead of trying every pattern in turn
+class IntentMatcher:
+    # The patterns are (regex, functionality, priority) tuples. Patterns with a higher
+    # priority are tried first, ties are broken by their order
+    def __init__(self, patterns):
+        patterns = sorted(patterns, key=lambda pattern: -pattern[2])
+
+        buckets = {}
+        unindexed = []
+        for order, (regex, functionality, _) in enumerate(patterns):
+            entry = (order, ParsedPattern(regex, functionality))
+            if entry[1].prefixes is None:
+                unindexed.append(entry)
+            else:
+                for prefix in entry[1].prefixes:
+                    buckets.setdefault(prefix, []).append(entry)
+
+        # Patterns without a known prefix may match any message, so they belong to all buckets
+        self._unindexed = FusedPattern(unindexed)
+        self._buckets = {prefix: FusedPattern(sorted(entries + unindexed, key=lambda x: x[0]))
+                            for prefix, entries in buckets.items()}
+
+    # Returns the functionality and the groups of the match, or None if nothing matches
+    def match(self, message):
+        match = self._match(message)
+        if match is None:
+            return None
+        functionality, regex_match, start, end = match
+        return functionality, regex_match.groups()[start - 1:end - 1]
+
+    # Like match, but also returns the (start, end) span of each group in the message,
+    # which is (-1, -1) for the groups that did not take part in the match
+    def match_spans(self, message):
+        match = self._match(message)
+        if match is None:
+            return None
+        functionality, regex_match, start, end = match
+        return functionality, regex_match.groups()[start - 1:end - 1], \
+            [regex_match.span(group) for group in range(start, end)]
+
+    # Returns the functionality, the regex match and the range of its groups which
+    # belong to the pattern
+    def _match(self, message):
+        prefix = message.lstrip()[:PREFIX_LENGTH].translate(PREFIX_FOLDING).lower()
+        return self._buckets.get(prefix, self._unindexed).match(message)
+
+class ParsedPattern:
+    def __init__(self, regex, functionality):
+        self.regex = regex
+        self.functionality = functionality
+        try:
+            parsed = sre_parse.parse(regex, re.I)
+        except re.error:
+            parsed = None
+        if parsed is None:
+            self.prefixes = None
+            self.is_fusable = False
+            self.group_count = None
+        else:
+            self.prefixes = _get_literal_prefixes(list(parsed), '')
+            self.is_fusable = _is_fusable(parsed) and _is_wrappable(regex)
+            self.group_count = parsed.state.groups - 1
+
+# A list of patterns fused in as few regex as possible, each pattern is wrapped in
+# a group so that the index of the outermost matched group identifies the pattern
+class FusedPattern:
+    def __init__(self, entries):
+        self._segments = []
+
+        fusable = []
+        for _, pattern in entries:
+            if pattern.is_fusable:
+                fusable.append(pattern)
+            else:
+                self._flush(fusable)
+                fusable = []
+                self._segments.append(SinglePattern(re.compile(pattern.regex, re.I),
+                                                    pattern.functionality))
+        self._flush(fusable)
+
+    def _flush(self, fusable):
+        for start in range(0, len(fusable), MAX_FUSED_PATTERNS):
+            self._segments.append(Alternation(fusable[start:start + MAX_FUSED_PATTERNS]))
+
+    def match(self, message):
+        for segment in self._segments:
+            match = segment.match(message)
+            if match is not None:
+                return match
+        return None
+
+class SinglePattern:
+    def __init__(self, compiled, functionality):
+        self.compiled = compiled
+        self.functionality = functionality
+
+    def match(self, message):
+        match = self.compiled.match(message)
+        if match is None:
+            return None
+        return self.functionality, match, 1, len(match.groups()) + 1
+
+class Alternation:
+    def __init__(self, fusable):
+        self._by_group = {}
+        parts = []
+        group = 1
+        for pattern in fusable:
+            self._by_group[group] = (pattern.functionality, group + 1,
+                                        group + 1 + pattern.group_count)
+            parts.append(f'({pattern.regex})')
+            group += pattern.group_count + 1
+        self.compiled = re.compile('|'.join(parts), re.I)
+
+    def match(self, message):
+        match = self.compiled.match(message)
+        if match is None:
+            return None
+        functionality, start, end = self._by_group[match.lastindex]
+        return functionality, match, start, end
+
+# Returns the set of lowercase prefixes one of which every match must start with,
+# after the leading whitespace, or None if there is no such set
+def _get_literal_prefixes(items, prefix):
+    for index, (op, av) in enumerate(items):
+        if len(prefix) >= PREFIX_LENGTH:
+            break
+        # The leading whitespace of the messages is not part of their prefix
+        if not prefix and _is_whitespace(op, av):
+            continue
+        if op is sre_parse.LITERAL and chr(av).isascii():
+            prefix += chr(av).lower()
+        elif op is sre_parse.SUBPATTERN:
+            return _get_literal_prefixes(list(av[-1]) + items[index + 1:], prefix)
+        elif op is sre_parse.BRANCH:
+            prefixes = set()
+            for alternative in av[1]:
+                alternative_prefixes = _get_literal_prefixes(
+                    list(alternative) + items[index + 1:], prefix)
+                if alternative_prefixes is None:
+                    return None
+                prefixes |= alternative_prefixes
+            return prefixes
+        else:
+            break
+    return {prefix[:PREFIX_LENGTH]} if len(prefix) >= PREFIX_LENGTH else None
+
+# Whether the item can only match whitespace
+def _is_whitespace(op, av):
+    if op is sre_parse.LITERAL:
+        return chr(av).isspace()
+    if op in REPEAT_OPS:
+        return all(_is_whitespace(*item) for item in av[2])
+    return [(op, av)] == WHITESPACE
+
+# Patterns with global inline flags, like (?i), can not be wrapped in a group. Before
+# Python 3.11 that is deprecated, and from then on it is an error
+def _is_wrappable(regex):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            sre_parse.parse(f'({regex})')
+        except (re.error, DeprecationWarning):
+            return False
+    return True
+
+# Patterns with named groups, group references or global flags can not be wrapped in a group
+def _is_fusable(parsed):
+    return not parsed.state.groupdict and \
+        parsed.state.flags & ~(re.I | re.U) == 0 and \
+        not _has_group_references(parsed)
+
+def _has_group_references(items):
+    for op, av in items:
+        if op in GROUP_REFERENCE_OPS:
+            return True
+        if op is sre_parse.SUBPATTERN and _has_group_references(av[-1]):
+            return True
+        if op is sre_parse.BRANCH and any(map(_has_group_references, av[1])):
+            return True
+        if op in REPEAT_OPS and _has_group_references(av[2]):
+            return True
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and _has_group_references(av[1]):
+            return True
+    return False
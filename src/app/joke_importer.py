@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import io
+import logging
+import time
+from itertools import islice
+from sqlalchemy import text
+from .const import APP_LOGGER_NAME, JOKE_IMPORT_BATCH_SIZE, MAIN_LOGGER_NAME
+from .database import Joke
+from .database.default_data import normalize_joke
+from .database.seeding import get_insert
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(MAIN_LOGGER_NAME)
+
+STAGING_TABLE = 'joke_import'
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.duplicates = 0
+        self.inserted = 0
+        self.seconds = 0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds > 0 else 0
+
+# Reads the files line by line, one joke per line. Files ending in .gz are decompressed
+def read_jokes(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as joke_file:
+            for line in joke_file:
+                joke = normalize_joke(line)
+                if joke:
+                    yield joke
+
+# Leaves out the jokes repeated in the input. Only 8 bytes of the hash of each joke are
+# kept, so millions of them fit in memory. The jokes already in the database are left
+# out when they are inserted
+def skip_duplicates(jokes, stats):
+    seen = set()
+    for joke in jokes:
+        digest = hashlib.blake2b(joke.encode('utf-8'), digest_size=8).digest()
+        if digest in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(digest)
+        yield joke
+
+# Inserts the jokes of the files in batches, each committed on its own, so that memory
+# use is bounded and a failure only loses the batch being inserted. Since the existing
+# jokes are skipped, the import can be run again after a failure
+def import_jokes(engine, paths, batch_size=JOKE_IMPORT_BATCH_SIZE, on_batch=None):
+    stats = ImportStats()
+    start = time.perf_counter()
+    def count_read(jokes):
+        for joke in jokes:
+            stats.read += 1
+            yield joke
+    jokes = skip_duplicates(count_read(read_jokes(paths)), stats)
+
+    with engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            insert_batch = copy_batch
+            connection.execute(text(f'CREATE TEMPORARY TABLE {STAGING_TABLE} (joke TEXT)'))
+            connection.commit()
+        else:
+            insert_batch = insert_batch_ignoring_duplicates
+        while True:
+            batch = list(islice(jokes, batch_size))
+            if not batch:
+                break
+            stats.inserted += insert_batch(connection, batch)
+            connection.commit()
+            stats.seconds = time.perf_counter() - start
+            if on_batch is not None:
+                on_batch(stats)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+# PostgreSQL: the batch is copied to a staging table, which is much faster than inserting
+# the rows, and merged from there. Returns the number of jokes inserted
+def copy_batch(connection, batch):
+    data = io.StringIO(''.join(joke.translate(COPY_ESCAPES) + '\n' for joke in batch))
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {STAGING_TABLE} (joke) FROM STDIN', data)
+    finally:
+        cursor.close()
+    result = connection.execute(text(f'INSERT INTO {Joke.__tablename__} (joke, is_new) ' +
+                                        f'SELECT joke, TRUE FROM {STAGING_TABLE} ' +
+                                        'ON CONFLICT (joke) DO NOTHING'))
+    connection.execute(text(f'TRUNCATE {STAGING_TABLE}'))
+    return result.rowcount
+
+# Other databases, like SQLite: the batch is inserted in a single statement
+def insert_batch_ignoring_duplicates(connection, batch):
+    result = connection.execute(get_insert(connection, Joke).on_conflict_do_nothing(),
+                                [{'joke': joke, 'is_new': True} for joke in batch])
+    return result.rowcount
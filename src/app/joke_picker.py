@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, text, DateTime
+from sqlalchemy.sql.expression import func, select, update
+from .const import JOKE_BATCH_SIZE, JOKE_CLAIM_TTL_SECONDS, JOKE_ID_RANGE_TTL_SECONDS, \
+    JOKE_TOLD_FLUSH_SIZE
+from .database import db, Joke
+
+# Claims a batch of new jokes which are not claimed by another picker and returns them,
+# in a single statement so that the same new joke is never claimed twice. The batch
+# starts at a random id
+CLAIM_NEW_JOKES_SQL = '''
+UPDATE joke SET claimed_until = :claimed_until
+WHERE is_new AND (claimed_until IS NULL OR claimed_until < :now) AND id IN (
+    SELECT id FROM joke
+    WHERE is_new AND (claimed_until IS NULL OR claimed_until < :now) AND id >= :start
+    ORDER BY id LIMIT :limit {lock}
+)
+RETURNING id, joke
+'''
+
+# Picks random jokes using random ids instead of sorting the whole table.
+# New jokes are claimed in batches which are kept in memory, and the jokes which
+# are told are marked in batches too. The claims expire, so the new jokes of a picker
+# which crashes are not lost, only the ones told since the last flush may be told again
+class JokePicker:
+    def __init__(self, batch_size=JOKE_BATCH_SIZE, told_flush_size=JOKE_TOLD_FLUSH_SIZE,
+                    claim_ttl_seconds=JOKE_CLAIM_TTL_SECONDS):
+        self.batch_size = batch_size
+        self.told_flush_size = told_flush_size
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self._new_jokes = []
+        self._claims_expire_at = 0
+        self._told_ids = []
+        self._id_range = None
+        self._id_range_expires_at = 0
+        # Created in the event loop where the picker is used
+        self._claim_lock = None
+
+    async def pick_new(self):
+        if time.monotonic() > self._claims_expire_at:
+            # Other pickers may have claimed them since, and the told ones must not be
+            await self.flush()
+            self._new_jokes = []
+        if not self._new_jokes:
+            if self._claim_lock is None:
+                self._claim_lock = asyncio.Lock()
+            # One batch is claimed at a time, the callers waiting for it take from it
+            async with self._claim_lock:
+                if not self._new_jokes:
+                    await self._claim_new_jokes()
+        if not self._new_jokes:
+            return None
+        joke_id, joke = self._new_jokes.pop()
+        await self._mark_told(joke_id)
+        return joke
+
+    async def pick_any(self):
+        id_range = await self._get_id_range()
+        if id_range is None:
+            return None
+        async with db.get_new_async_session() as session:
+            stmt = select(Joke.id, Joke.joke).order_by(Joke.id).limit(1)
+            row = (await session.execute(stmt.where(Joke.id >= random.randint(*id_range)))).first()
+            if row is None:
+                row = (await session.execute(stmt)).first()
+        if row is None:
+            return None
+        await self._mark_told(row[0])
+        return row[1]
+
+    async def _mark_told(self, joke_id):
+        self._told_ids.append(joke_id)
+        if len(self._told_ids) >= self.told_flush_size:
+            await self.flush()
+
+    # Marks the jokes which have been told as old
+    async def flush(self):
+        if not self._told_ids:
+            return
+        told_ids, self._told_ids = self._told_ids, []
+        async with db.get_new_async_session() as session:
+            await session.execute(update(Joke).where(Joke.id.in_(told_ids)).values(is_new=False))
+            await session.commit()
+
+    # Flushes the told jokes and gives back the claimed new jokes which were not told
+    async def close(self):
+        await self.flush()
+        if self._new_jokes:
+            unused_ids = [joke_id for joke_id, _ in self._new_jokes]
+            self._new_jokes = []
+            async with db.get_new_async_session() as session:
+                await session.execute(update(Joke).where(Joke.id.in_(unused_ids))
+                                        .values(claimed_until=None))
+                await session.commit()
+
+    async def _claim_new_jokes(self):
+        id_range = await self._get_id_range(refresh=True)
+        if id_range is None:
+            return
+        lock = 'FOR UPDATE SKIP LOCKED' if db.async_engine.dialect.name == 'postgresql' else ''
+        now = datetime.utcnow()
+        stmt = text(CLAIM_NEW_JOKES_SQL.format(lock=lock)).bindparams(
+            bindparam('now', now, type_=DateTime),
+            bindparam('claimed_until', now + timedelta(seconds=self.claim_ttl_seconds),
+                        type_=DateTime))
+        # Given up a little before they expire in the database
+        self._claims_expire_at = time.monotonic() + self.claim_ttl_seconds * 0.9
+        async with db.get_new_async_session() as session:
+            start = random.randint(*id_range)
+            jokes = (await session.execute(stmt, {'start': start,
+                                                'limit': self.batch_size})).all()
+            if len(jokes) < self.batch_size:
+                # Wrap around to the beginning of the table
+                jokes += (await session.execute(stmt, {'start': id_range[0],
+                                                'limit': self.batch_size - len(jokes)})).all()
+            await session.commit()
+        random.shuffle(jokes)
+        self._new_jokes.extend(tuple(joke) for joke in jokes)
+
+    async def _get_id_range(self, refresh=False):
+        if refresh or self._id_range is None or time.monotonic() > self._id_range_expires_at:
+            async with db.get_new_async_session() as session:
+                min_id, max_id = (await session.execute(
+                    select(func.min(Joke.id), func.max(Joke.id)))).one()
+            self._id_range = None if min_id is None else (min_id, max_id)
+            self._id_range_expires_at = time.monotonic() + JOKE_ID_RANGE_TTL_SECONDS
+        return self._id_range
@@ -0,0 +1,120 @@
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from .const import APP_LOGGER_NAME, CHATBOT_LOG_FILE, CHATBOT_LOGGER_NAME, DEFAULT_LOG_FILE, \
+    DISPATCHER_LOGGER_NAME, LOG_ASYNC, LOG_BACKUP_COUNT, LOG_DEBUG_SAMPLE_RATES, LOG_JSON_LINES, \
+    LOG_MAX_BYTES, LOG_QUEUE_SIZE, MAIN_LOGGER_NAME, USER_LOGGER_NAME
+from .metrics import LOG_RECORDS_DROPPED
+
+LOG_FORMAT = '%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s'
+LOG_DATE_FORMAT = '%H:%M:%S'
+
+# Records are put in a bounded queue and written by the listener thread, so the
+# event loop never waits for the disk. When the queue is full the record is dropped
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    # The default implementation formats the message in the calling thread, instead
+    # it is left to the handlers of the listener
+    def prepare(self, record):
+        return record
+
+# Keeps a fraction of the debug records of the given loggers and their children
+class DebugSamplingFilter:
+    def __init__(self, sample_rates):
+        self.sample_rates = sample_rates
+        self._logger_rates = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._logger_rates.get(record.name)
+        if rate is None:
+            rate = self._logger_rates[record.name] = self._get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+    def _get_rate(self, name):
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+class LoggerNameFilter:
+    def __init__(self, *names):
+        self.names = names
+
+    def filter(self, record):
+        return any(record.name == name or record.name.startswith(f'{name}.')
+                    for name in self.names)
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+# Library logs go to the default log file, app logs additionally go to a separate file,
+# and errors from the app loggers are shown in the console. Returns the listener
+# writing the records, which is stopped at exit, or None if logging is synchronous
+def configure_logging(level=logging.DEBUG, log_file=DEFAULT_LOG_FILE,
+                        app_log_file=CHATBOT_LOG_FILE, use_queue=LOG_ASYNC,
+                        json_lines=LOG_JSON_LINES, sample_rates=None):
+    if sample_rates is None:
+        sample_rates = LOG_DEBUG_SAMPLE_RATES
+    if json_lines:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT)
+    app_file_handler = logging.handlers.RotatingFileHandler(app_log_file,
+                                                        maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT)
+    app_file_handler.addFilter(LoggerNameFilter(APP_LOGGER_NAME))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.ERROR)
+    stream_handler.addFilter(LoggerNameFilter(
+        *(f'{APP_LOGGER_NAME}.{name}'
+            for name in (MAIN_LOGGER_NAME, CHATBOT_LOGGER_NAME, DISPATCHER_LOGGER_NAME,
+                            USER_LOGGER_NAME))))
+    handlers = (file_handler, app_file_handler, stream_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    sampling_filter = DebugSamplingFilter(sample_rates)
+    if not use_queue:
+        for handler in handlers:
+            handler.addFilter(sampling_filter)
+            root_logger.addHandler(handler)
+        return None
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(sampling_filter)
+    root_logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers,
+                                                respect_handler_level=True)
+    listener.start()
+    # Registered after logging, so it runs before the handlers are closed
+    atexit.register(listener.stop)
+    return listener
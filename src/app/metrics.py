@@ -0,0 +1,190 @@
+import time
+from bisect import bisect_left
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0)
+
+# Metrics are stored per tuple of label values, recording a value is a dictionary
+# lookup and an addition, all the formatting is done when they are rendered
+
+class Counter:
+    metric_type = 'counter'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, self.label_names, labels, value
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def __init__(self, name, description, label_names=()):
+        super().__init__(name, description, label_names)
+        self._functions = {}
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    # The value is computed when the metrics are rendered
+    def set_function(self, *labels, function):
+        self._functions[labels] = function
+
+    def samples(self):
+        yield from super().samples()
+        for labels, function in self._functions.items():
+            yield self.name, self.label_names, labels, function()
+
+class Histogram:
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values = {}
+
+    def observe(self, value, *labels):
+        values = self._values.get(labels)
+        if values is None:
+            # One counter per bucket, plus the sum and the count
+            values = self._values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            values[index] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self, *labels):
+        return HistogramTimer(self, labels)
+
+    def samples(self):
+        label_names = self.label_names + ('le',)
+        for labels, values in self._values.items():
+            cumulative = 0
+            for bucket, count in zip(self.buckets, values):
+                cumulative += count
+                yield f'{self.name}_bucket', label_names, labels + (str(bucket),), cumulative
+            yield f'{self.name}_bucket', label_names, labels + ('+Inf',), values[-1]
+            yield f'{self.name}_sum', self.label_names, labels, values[-2]
+            yield f'{self.name}_count', self.label_names, labels, values[-1]
+
+class HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name, description, label_names=()):
+        return self._register(Counter(name, description, label_names))
+
+    def gauge(self, name, description, label_names=()):
+        return self._register(Gauge(name, description, label_names))
+
+    def histogram(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    # Renders the metrics in the Prometheus text exposition format
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for name, label_names, labels, value in metric.samples():
+                if label_names:
+                    label_text = ','.join(f'{label_name}="{_escape(str(label))}"'
+                                            for label_name, label in zip(label_names, labels))
+                    lines.append(f'{name}{{{label_text}}} {value}')
+                else:
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+# Serves the metrics on the web server of the agent
+def serve_metrics(agent, hostname, port):
+    async def get_metrics(_):
+        return web.Response(text=metrics.render(), content_type='text/plain')
+    agent.web.add_get('/metrics', get_metrics, None, raw=True)
+    agent.web.start(hostname=hostname, port=port)
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+metrics = MetricsRegistry()
+
+REQUESTS = metrics.counter('chatbot_requests_total',
+    'Requests received, per functionality', ('functionality',))
+INTENT_MATCH_SECONDS = metrics.histogram('chatbot_intent_match_seconds',
+    'Time spent selecting the functionality of a request')
+BEHAVIOUR_SECONDS = metrics.histogram('chatbot_behaviour_seconds',
+    'Time spent running each request behaviour', ('behaviour',))
+REJECTED_REQUESTS = metrics.counter('chatbot_rejected_requests_total',
+    'Requests rejected by the admission control, per reason', ('reason',))
+IN_FLIGHT_BEHAVIOURS = metrics.gauge('chatbot_in_flight_behaviours',
+    'Request behaviours which are running or waiting to run')
+HTTP_REQUEST_SECONDS = metrics.histogram('chatbot_http_request_seconds',
+    'Time spent in outbound HTTP requests', ('host', 'status'))
+HEDGED_REQUESTS = metrics.counter('chatbot_hedged_requests_total',
+    'Outbound requests sent twice, per host and attempt which answered first',
+    ('host', 'attempt'))
+DB_QUERY_SECONDS = metrics.histogram('chatbot_db_query_seconds',
+    'Time spent executing database statements')
+FUZZY_MATCH_SECONDS = metrics.histogram('chatbot_fuzzy_match_seconds',
+    'Time spent looking for the closest functionality of the messages no regex matches')
+FUZZY_MATCHES = metrics.counter('chatbot_fuzzy_matches_total',
+    'Messages no regex matches, per outcome: corrected, suggested or none', ('result',))
+PARSE_SECONDS = metrics.histogram('chatbot_parse_seconds',
+    'Time to parse a response, including the wait for a parsing process', ('function',))
+XMPP_MESSAGES_RECEIVED = metrics.counter('chatbot_xmpp_messages_received_total',
+    'XMPP messages received, per language', ('language',))
+XMPP_MESSAGES_SENT = metrics.counter('chatbot_xmpp_messages_sent_total',
+    'XMPP messages sent, per performative', ('performative',))
+DISPATCHED_REQUESTS = metrics.counter('chatbot_dispatched_requests_total',
+    'Requests forwarded by the dispatcher, per worker', ('worker',))
+HEALTHY_WORKERS = metrics.gauge('chatbot_healthy_workers',
+    'Workers which sent a heartbeat recently')
+CACHE_REQUESTS = metrics.counter('chatbot_cache_requests_total',
+    'Cache lookups, per cache and result', ('cache', 'result'))
+SINGLE_FLIGHT_CALLS = metrics.counter('chatbot_single_flight_calls_total',
+    'Lookups started or shared with an identical one in progress', ('name', 'result'))
+CACHE_HIT_RATIO = metrics.gauge('chatbot_cache_hit_ratio',
+    'Ratio of cache lookups which were hits', ('cache',))
+LOG_RECORDS_DROPPED = metrics.counter('chatbot_log_records_dropped_total',
+    'Log records dropped because the logging queue was full')
+CONVERSATION_LOG_ROWS_WRITTEN = metrics.counter('chatbot_conversation_log_rows_written_total',
+    'Rows of the conversation log written to the database')
+CONVERSATION_LOG_ROWS_DROPPED = metrics.counter('chatbot_conversation_log_rows_dropped_total',
+    'Rows of the conversation log dropped because the database failed')
+DEADLINES_EXCEEDED = metrics.counter('chatbot_deadlines_exceeded_total',
+    'Request behaviours cancelled because they ran out of time', ('behaviour',))
@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .const import APP_LOGGER_NAME, CHATBOT_LOGGER_NAME, PARSE_PRELOADED_MODULES, \
+    PARSE_PROCESSES
+from .metrics import PARSE_SECONDS
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
+
+# Run in each process when it starts, importing the modules of the parsing functions,
+# like lxml, is what takes time
+def preload(module_names):
+    for module_name in module_names:
+        importlib.import_module(module_name)
+
+def warm_up():
+    return None
+
+# Runs CPU bound functions in other processes, so that they do not hold the event loop.
+# The processes are spawned instead of forked, since the agent has threads running.
+# With no processes, the functions are run in the event loop
+class ParsePool:
+    def __init__(self, processes=PARSE_PROCESSES, preloaded_modules=PARSE_PRELOADED_MODULES):
+        self.processes = processes
+        self.preloaded_modules = preloaded_modules
+        self.executor = None
+
+    # Spawns the processes and preloads the modules, instead of waiting for the first request
+    async def start(self):
+        if self.processes <= 0:
+            return
+        self.executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, warm_up)
+                                for _ in range(self.processes)))
+        logger.debug('Started %d parsing processes', self.processes)
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.processes,
+                                    mp_context=multiprocessing.get_context('spawn'),
+                                    initializer=preload, initargs=(self.preloaded_modules,))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    # The arguments and the result are pickled, so they should be kept small
+    async def run(self, function, *args):
+        with PARSE_SECONDS.time(function.__name__):
+            executor = self.executor
+            if executor is None:
+                return function(*args)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor,
+                                                                        function, *args)
+            except BrokenProcessPool:
+                # A process died and the rest were stopped with it, so start again,
+                # unless a concurrent call already did
+                if self.executor is executor:
+                    logger.warning('A parsing process stopped unexpectedly, restarting them')
+                    executor.shutdown(wait=False)
+                    self.executor = self._create_executor()
+                return function(*args)
@@ -0,0 +1,93 @@
+import re
+from lxml import etree
+from .person_outcome import PersonOutcome
+
+# Size of the pieces of the page fed to the parser, parsing stops as soon as
+# the first paragraph is found, so most of the page is usually never parsed
+FEED_SIZE = 16 * 1024
+MIN_PARAGRAPH_LENGTH = 6
+IGNORED_TAGS = {'script', 'style', 'template'}
+
+DISAMBIGUATION_REGEX = re.compile(rb'''id\s*=\s*["']?disambigbox\b''', re.I)
+NOT_EXISTS_REGEX = re.compile(r'The page \".*\" does not exist\. You can ask for it to be created')
+CITATION_REGEX = re.compile(r'\[[^\[]*\]')
+
+# Finds the first paragraph of the content of a Wikipedia page
+def extract_person_info(content):
+    # The disambiguation box may be at the end of the page, so look for it in the raw
+    # bytes before parsing, and only parse the whole page to confirm it
+    if DISAMBIGUATION_REGEX.search(content) is not None and _is_ambiguous(content):
+        return PersonOutcome.AMBIGUOUS, None
+
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    content_text = None
+    for piece in _split_pieces(content):
+        parser.feed(piece)
+        for event, element in parser.read_events():
+            if event == 'start':
+                if content_text is None and element.tag == 'div' and \
+                        element.get('id') == 'mw-content-text':
+                    content_text = element
+            elif element is content_text:
+                return PersonOutcome.NOT_FOUND, None
+            elif content_text is not None and element.tag == 'p':
+                text = _get_text(element)
+                if len(text) >= MIN_PARAGRAPH_LENGTH:
+                    return _get_outcome(text)
+
+    # Use a more general id if the previous one stops working
+    root = parser.close()
+    if content_text is not None or root is None:
+        return PersonOutcome.NOT_FOUND, None
+    body_content = next(root.iterfind('.//div[@id="bodyContent"]'), None)
+    if body_content is None:
+        return PersonOutcome.NOT_FOUND, None
+    longest_child = None
+    longest_length = -1
+    for child in body_content.iterchildren(tag=etree.Element):
+        length = len(_get_text(child))
+        if length >= longest_length:
+            longest_child, longest_length = child, length
+    if longest_child is None:
+        return PersonOutcome.NOT_FOUND, None
+    for paragraph in longest_child.iterdescendants('p'):
+        text = _get_text(paragraph)
+        if len(text) >= MIN_PARAGRAPH_LENGTH:
+            return _get_outcome(text)
+    return PersonOutcome.NOT_FOUND, None
+
+# The pieces end before a tag where possible. libxml2 takes the rest of the page as the
+# contents of a script or a style whose end tag is split between two pieces
+def _split_pieces(content):
+    offset = 0
+    while offset < len(content):
+        end = content.rfind(b'<', offset + 1, offset + FEED_SIZE)
+        if end == -1:
+            end = offset + FEED_SIZE
+        yield content[offset:end]
+        offset = end
+
+def _is_ambiguous(content):
+    root = etree.fromstring(content, etree.HTMLParser())
+    return root is not None and next(root.iterfind('.//div[@id="disambigbox"]'), None) is not None
+
+def _get_outcome(text):
+    if NOT_EXISTS_REGEX.match(text.strip()) is not None:
+        return PersonOutcome.NOT_FOUND, None
+    return PersonOutcome.FOUND, CITATION_REGEX.sub('', text).strip()
+
+# Text of the element, without comments nor the contents of scripts and styles
+def _get_text(element):
+    parts = []
+    _collect_text(element, parts)
+    return ''.join(parts)
+
+def _collect_text(element, parts):
+    if not isinstance(element.tag, str) or element.tag in IGNORED_TAGS:
+        return
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy.sql.expression import select
+from .const import PERSON_CACHE_NEGATIVE_TTL_SECONDS, PERSON_CACHE_SIZE, PERSON_CACHE_TTL_SECONDS
+from .database import db, PersonInfo
+from .metrics import CACHE_HIT_RATIO, CACHE_REQUESTS
+from .person_outcome import PersonOutcome
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()
+
+# The ratio of the process, counting the lookups of the caches of all its agents
+def get_hit_ratio():
+    hits = CACHE_REQUESTS.get('person_info', 'memory_hit') + \
+            CACHE_REQUESTS.get('person_info', 'database_hit')
+    total = hits + CACHE_REQUESTS.get('person_info', 'miss')
+    return hits / total if total > 0 else 0.0
+
+CACHE_HIT_RATIO.set_function('person_info', function=get_hit_ratio)
+
+# Results of the searches about people, kept in memory in least recently used order
+# and in the database, so they survive restarts and are shared between processes.
+# Negative results (ambiguous or unknown names) expire sooner
+class PersonInfoCache:
+    def __init__(self, size=PERSON_CACHE_SIZE, ttl_seconds=PERSON_CACHE_TTL_SECONDS,
+                    negative_ttl_seconds=PERSON_CACHE_NEGATIVE_TTL_SECONDS):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries = OrderedDict()
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+
+    # Returns a (outcome, summary) tuple, or None if the name is not cached
+    async def get(self, name):
+        key = normalize_name(name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            outcome, summary, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_REQUESTS.inc('person_info', 'memory_hit')
+                return outcome, summary
+            del self._entries[key]
+
+        async with db.get_new_async_session() as session:
+            row = (await session.execute(select(PersonInfo)
+                .where(PersonInfo.name == key)
+                .where(PersonInfo.expires_at > datetime.utcnow()))).first()
+        if row is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc('person_info', 'miss')
+            return None
+        self.database_hits += 1
+        CACHE_REQUESTS.inc('person_info', 'database_hit')
+        person_info = row[0]
+        self._remember(key, person_info.outcome, person_info.summary,
+                        person_info.expires_at - datetime.utcnow())
+        return person_info.outcome, person_info.summary
+
+    async def put(self, name, outcome, summary):
+        key = normalize_name(name)
+        ttl = timedelta(seconds=self.ttl_seconds if outcome is PersonOutcome.FOUND
+                                else self.negative_ttl_seconds)
+        self._remember(key, outcome, summary, ttl)
+        async with db.get_new_async_session() as session:
+            await session.merge(PersonInfo(name=key, outcome=outcome, summary=summary,
+                                            expires_at=datetime.utcnow() + ttl))
+            await session.commit()
+
+    def _remember(self, key, outcome, summary, ttl):
+        self._entries[key] = (outcome, summary, time.time() + ttl.total_seconds())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_ratio(self):
+        total = self.memory_hits + self.database_hits + self.misses
+        return (self.memory_hits + self.database_hits) / total if total > 0 else 0.0
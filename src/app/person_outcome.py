@@ -0,0 +1,6 @@
+from enum import Enum
+
+class PersonOutcome(Enum):
+    FOUND = 'FOUND'
+    AMBIGUOUS = 'AMBIGUOUS'
+    NOT_FOUND = 'NOT_FOUND'
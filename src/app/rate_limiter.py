@@ -0,0 +1,43 @@
+import time
+from collections import OrderedDict
+from .const import RATE_LIMIT_BURST, RATE_LIMIT_MAX_SENDERS, RATE_LIMIT_TOKENS_PER_SECOND
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+# One token bucket per sender. The buckets are kept in least recently used order, and
+# the oldest are dropped when there are too many, since they have most likely refilled
+class RateLimiter:
+    def __init__(self, tokens_per_second=RATE_LIMIT_TOKENS_PER_SECOND, burst=RATE_LIMIT_BURST,
+                    max_senders=RATE_LIMIT_MAX_SENDERS):
+        self.tokens_per_second = tokens_per_second
+        self.burst = burst
+        self.max_senders = max_senders
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    # Takes the tokens if the sender has enough of them. A cost over the burst is taken
+    # as the whole burst, otherwise the request could never be admitted
+    def try_acquire(self, key, cost=1) -> bool:
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            while len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(self.burst,
+                                bucket.tokens + (now - bucket.updated) * self.tokens_per_second)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+        if bucket.tokens < cost:
+            return False
+        bucket.tokens -= cost
+        return True
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from .const import MAX_SESSIONS, SESSION_IDLE_SECONDS
+
+class Session:
+    __slots__ = ('jid', 'last_seen', 'last_request')
+
+    def __init__(self, jid):
+        self.jid = jid
+        self.last_seen = time.monotonic()
+        self.last_request = None
+
+    def __repr__(self) -> str:
+        return f'Session(jid={self.jid!r}, last_seen={self.last_seen!r})'
+
+    @property
+    def is_busy(self):
+        return self.last_request is not None and not self.last_request.finished.is_set()
+
+# Sessions are kept in least recently seen order, so both the idle and the
+# exceeding sessions are always at the beginning. The busy sessions, whose last request
+# has not finished, are never evicted, since the next request of the user must wait for it
+class SessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, jid):
+        return jid in self._sessions
+
+    def get(self, jid):
+        return self._sessions.get(jid)
+
+    def touch(self, jid) -> Session:
+        session = self._sessions.get(jid)
+        if session is None:
+            excess = len(self._sessions) + 1 - self.max_sessions
+            if excess > 0:
+                self._evict(excess)
+            session = Session(jid)
+            self._sessions[jid] = session
+        else:
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(jid)
+        return session
+
+    def remove(self, jid):
+        self._sessions.pop(jid, None)
+
+    def evict_idle(self) -> int:
+        return self._evict(len(self._sessions), time.monotonic() - self.idle_seconds)
+
+    # Evicts up to count sessions, the least recently seen first, and only those seen
+    # before seen_before if it is given. The busy ones are skipped, so there may be more
+    # sessions than max_sessions while their requests are running
+    def _evict(self, count, seen_before=None):
+        evicted = []
+        for jid, session in self._sessions.items():
+            if len(evicted) == count or \
+                    (seen_before is not None and session.last_seen > seen_before):
+                break
+            if not session.is_busy:
+                evicted.append(jid)
+        for jid in evicted:
+            del self._sessions[jid]
+        return len(evicted)
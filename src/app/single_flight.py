@@ -0,0 +1,54 @@
+import asyncio
+from .deadline import ensure_future_without_deadline, get_remaining
+from .exceptions import CallCancelledException
+from .metrics import SINGLE_FLIGHT_CALLS
+
+class SingleFlightCall:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+# Runs a single call at a time per key: whoever asks for a key which is already running
+# waits for that call and gets the same result, or the same exception. A waiter being
+# cancelled does not cancel the call unless nobody else is waiting for it, in which case
+# the call is forgotten at once, so that the next caller starts a new one. The call does
+# not have the deadline of the caller which started it, each caller waits for it only
+# until its own deadline
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def run(self, key, function, *args):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = SingleFlightCall(
+                ensure_future_without_deadline(function(*args)))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            SINGLE_FLIGHT_CALLS.inc(self.name, 'started')
+        else:
+            SINGLE_FLIGHT_CALLS.inc(self.name, 'shared')
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), get_remaining())
+        except asyncio.CancelledError:
+            # Only the caller being cancelled may raise CancelledError, otherwise SPADE
+            # takes the behaviour as cancelled and does not end it
+            if call.task.cancelled():
+                raise CallCancelledException(f'Call to {self.name} was cancelled') from None
+            raise
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
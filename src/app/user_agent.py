@@ -24,6 +24,7 @@ class UserAgent(agent.Agent):
         template.set_metadata('performative', 'inform')
         template.set_metadata('language', 'chatbot-greeting')
         self.add_behaviour(AwaitGreetingBehaviour(), template)
+        self.add_behaviour(RequestGreetingBehaviour())
 
         template = Template()
         template.set_metadata('performative', 'request')
@@ -31,6 +32,14 @@ class UserAgent(agent.Agent):
         self.exit_behaviour = ReceiveExitBehaviour()
         self.add_behaviour(self.exit_behaviour, template)
 
+class RequestGreetingBehaviour(OneShotBehaviour):
+    async def run(self):
+        logger.debug('Requesting greeting from chatbot')
+        message = Message(to=self.agent.chatbot_address)
+        message.set_metadata('performative', 'request')
+        message.set_metadata('language', 'chatbot-greeting')
+        await self.send(message)
+
 class AwaitGreetingBehaviour(OneShotBehaviour):
     async def run(self):
         logger.debug('Waiting for chatbot greeting')
@@ -70,7 +79,7 @@ class AssistUserBehaviour(CyclicBehaviour):
         if response is None:
             logger.warning('Timeout exceeded while waiting for chatbot response')
             return
-        logger.debug('Received response: %s', str(response))
+        logger.debug('Received response: %s', response)
         print(la['BOT_ANSWER_F'].format(response=response.body))
 
 class ReceiveExitBehaviour(CyclicBehaviour):
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Measures the time needed to find the closest example phrase of a misspelled message
+# with the FuzzyMatcher, against scoring every phrase in turn, for an increasing number
+# of example phrases. Also shows what the default data makes of some misspelled commands.
+# Run from the src folder: python3 -m benchmarks.fuzzy_matcher_benchmark
+
+import random
+import string
+import timeit
+from app.const import FUZZY_RUN_MIN_SCORE
+from app.database.default_data import get_default_functionality_examples, \
+    get_default_functionality_regex
+from app.fuzzy_matcher import FuzzyMatcher, get_ngrams, normalize
+from app.intent_matcher import IntentMatcher
+
+EXAMPLE_COUNTS = (10, 100, 1000, 10000)
+MESSAGE_COUNT = 200
+REPEAT = 3
+MISSPELLED_COMMANDS = ['tel me a joke', 'donwload 5 gifs of cats', 'show me teh time',
+                        'wht can you do', 'creat file \'notes.txt\'', 'who iz Ada Lovelace',
+                        'tell me a jok', 'hello there',
+                        'creat file \'maek.txt\' containing \'nammed\'',
+                        'creat files \'fil\', \'filez\'', 'downlod 3 gifs of soem cats']
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+
+# Randomly replaces, removes or swaps a character
+def misspell(text, rng):
+    index = rng.randrange(len(text) - 1)
+    operation = rng.randrange(3)
+    if operation == 0:
+        return text[:index] + rng.choice(string.ascii_lowercase) + text[index + 1:]
+    if operation == 1:
+        return text[:index] + text[index + 1:]
+    return text[:index] + text[index + 1] + text[index] + text[index + 2:]
+
+# The default examples, plus phrases of three to six random words
+def generate_examples(count, rng):
+    examples = [(row['phrase'], row['functionality'])
+                for row in get_default_functionality_examples()]
+    while len(examples) < count:
+        examples.append((' '.join(random_word(rng) for _ in range(rng.randint(3, 6))), None))
+    return examples[:count]
+
+def generate_messages(examples, rng):
+    return [misspell(rng.choice(examples)[0], rng) for _ in range(MESSAGE_COUNT)]
+
+def main():
+    rng = random.Random(0)
+    print(f'{"examples":>10} {"linear (us/msg)":>16} {"matcher (us/msg)":>17} {"build (ms)":>11}')
+    for count in EXAMPLE_COUNTS:
+        examples = generate_examples(count, rng)
+        messages = generate_messages(examples, rng)
+
+        example_ngrams = [get_ngrams(normalize(phrase)) for phrase, _ in examples]
+        def linear():
+            for message in messages:
+                ngrams = get_ngrams(normalize(message))
+                max(len(ngrams & other) / len(ngrams | other) for other in example_ngrams)
+
+        build_time = min(timeit.repeat(lambda: FuzzyMatcher(examples), number=1, repeat=1))
+        matcher = FuzzyMatcher(examples)
+        def indexed():
+            for message in messages:
+                matcher.match(message)
+
+        linear_time = min(timeit.repeat(linear, number=1, repeat=REPEAT))
+        indexed_time = min(timeit.repeat(indexed, number=1, repeat=REPEAT))
+        print(f'{count:>10} {linear_time / MESSAGE_COUNT * 1e6:>16.2f} ' +
+                f'{indexed_time / MESSAGE_COUNT * 1e6:>17.2f} {build_time * 1e3:>11.1f}')
+
+    patterns = [(row['regex'], row['functionality'], row.get('priority', 0))
+                for row in get_default_functionality_regex()]
+    intent_matcher = IntentMatcher(patterns)
+    matcher = FuzzyMatcher([(row['phrase'], row['functionality'])
+                            for row in get_default_functionality_examples()], patterns)
+    print()
+    for command in MISSPELLED_COMMANDS:
+        fuzzy_match = matcher.match(command)
+        correction = None if fuzzy_match is None else fuzzy_match.correct(intent_matcher)
+        if correction is not None and fuzzy_match.score >= FUZZY_RUN_MIN_SCORE:
+            print(f'{command!r}: run as {correction[0]!r} (score {fuzzy_match.score:.2f})')
+        elif correction is not None:
+            print(f'{command!r}: suggest {correction[0]!r} (score {fuzzy_match.score:.2f})')
+        elif fuzzy_match is not None and fuzzy_match.suggestion is not None:
+            print(f'{command!r}: suggest {fuzzy_match.suggestion!r} ' +
+                    f'(score {fuzzy_match.score:.2f})')
+        else:
+            print(f'{command!r}: not understood')
+
+if __name__ == '__main__':
+    main()
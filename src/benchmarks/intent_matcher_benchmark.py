@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Compares the time needed to match a message with the IntentMatcher against
+# trying every pattern in turn, for an increasing number of patterns. The patterns start
+# with distinct words, which is the best case for the prefix index, with the same words,
+# or with no literal text at all, in which case every pattern is in every bucket.
+# Run from the src folder: python3 -m benchmarks.intent_matcher_benchmark
+
+import random
+import re
+import string
+import timeit
+from app.database.default_data import get_default_functionality_regex
+from app.intent_matcher import IntentMatcher
+
+PATTERN_COUNTS = (10, 100, 1000, 10000)
+MESSAGE_COUNT = 1000
+REPEAT = 5
+DISTINCT_PREFIXES = 'distinct prefixes'
+SHARED_PREFIX = 'shared prefix'
+NO_PREFIX = 'no prefix'
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+
+# Generates patterns with the same shape as the default ones, plus the default ones
+def generate_patterns(count, shape, rng):
+    patterns = [(row['regex'], row['functionality'], 0)
+                for row in get_default_functionality_regex()]
+    words = []
+    while len(patterns) < count:
+        verb = 'show' if shape == SHARED_PREFIX else random_word(rng)
+        noun = random_word(rng)
+        words.append((verb, noun))
+        start = r'(?:\w+\s+)?' if shape == NO_PREFIX else ''
+        patterns.append((rf'\s*{start}{verb}\s+(?:me\s+)?{noun}\s+(\S.*?)\s*\??\s*$',
+                            None, 0))
+    return patterns[:count], words
+
+def generate_messages(words, rng):
+    messages = []
+    for _ in range(MESSAGE_COUNT):
+        if words and rng.random() < 0.8:
+            verb, noun = rng.choice(words)
+            messages.append(f'{verb} me {noun} {random_word(rng)}?')
+        else:
+            messages.append(f'{random_word(rng)} {random_word(rng)}')
+    return messages
+
+def main():
+    rng = random.Random(0)
+    for shape in (DISTINCT_PREFIXES, SHARED_PREFIX, NO_PREFIX):
+        print(f'Patterns with {shape}')
+        print(f'{"patterns":>10} {"linear (us/msg)":>16} {"matcher (us/msg)":>17} ' +
+                f'{"build (ms)":>11}')
+        for count in PATTERN_COUNTS:
+            run_case(count, shape, rng)
+        print()
+
+def run_case(count, shape, rng):
+    patterns, words = generate_patterns(count, shape, rng)
+    messages = generate_messages(words, rng)
+
+    compiled = [(re.compile(regex, re.I), functionality)
+                for regex, functionality, _ in patterns]
+    def linear():
+        for message in messages:
+            for regex, _ in compiled:
+                if regex.match(message) is not None:
+                    break
+
+    build_time = min(timeit.repeat(lambda: IntentMatcher(patterns), number=1, repeat=1))
+    matcher = IntentMatcher(patterns)
+    def fused():
+        for message in messages:
+            matcher.match(message)
+
+    linear_time = min(timeit.repeat(linear, number=1, repeat=REPEAT))
+    fused_time = min(timeit.repeat(fused, number=1, repeat=REPEAT))
+    print(f'{count:>10} {linear_time / MESSAGE_COUNT * 1e6:>16.2f} ' +
+            f'{fused_time / MESSAGE_COUNT * 1e6:>17.2f} {build_time * 1e3:>11.1f}')
+
+if __name__ == '__main__':
+    main()
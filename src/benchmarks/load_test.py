@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# Measures the throughput of the chatbot and its latency per functionality, with simulated
+# users sending a mix of commands, one at a time each. No XMPP server is needed: the agents
+# exchange messages through the SPADE container, which delivers them directly when both
+# agents live in the same process. Wikipedia and Tenor are replaced by local stub servers,
+# and a temporary SQLite database and environment folder are used.
+# Run from the src folder: python3 -m benchmarks.load_test [--users N] [--requests N]
+#   [--mix SHOW_TIME=2,TELL_JOKE=1,...] [--stub-latency-ms N] [--rate-limit]
+#   [--workers N] [--balancing least-in-flight|functionality]
+#   [--record FOLDER | --replay FOLDER [--replay-latency-ms N] [--replay-error-rate R]]
+# With --record, the real Wikipedia and Tenor are used instead of the stubs, with the API keys
+# in the credentials, and their responses are stored in the folder. With --replay, the
+# responses stored in the folder are used, so the real pages are parsed without network.
+# With workers, the requests go through a dispatcher. All the agents share one event loop,
+# so this measures the overhead of dispatching rather than the gain of using more cores
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from aiohttp import web
+from spade import agent, quit_spade
+from spade.behaviour import OneShotBehaviour
+from spade.message import Message
+from sqlalchemy import update
+from app.chatbot_agent import ChatbotAgent
+from app.const import API_KEYS_FILE, DISPATCHER_BALANCING, TIMEOUT_SECONDS
+from app.database import db, BaseUrl
+from app.database.default_data import get_default_functionality_regex
+from app.dispatcher_agent import BALANCING_FUNCTIONALITY, BALANCING_LEAST_IN_FLIGHT, \
+    DispatcherAgent
+from app.functionality import Functionality
+from app.http_transport import HttpArchive, RecordingTransport, ReplayTransport
+from app.intent_matcher import IntentMatcher
+from app.loaded_answers import loaded_answers as la
+from app.rate_limiter import RateLimiter
+
+CHATBOT_JID = 'chatbot@loopback'
+DEFAULT_MIX = {
+    Functionality.SEND_FUNCTIONALITY: 1,
+    Functionality.SHOW_TIME: 2,
+    Functionality.SEARCH_PERSON_INFO: 2,
+    Functionality.MAKE_FILE: 1,
+    Functionality.DOWNLOAD_GIFS: 1,
+    Functionality.TELL_JOKE: 3,
+}
+PEOPLE = ['Ada Lovelace', 'Alan Turing', 'Grace Hopper', 'Edsger Dijkstra', 'Barbara Liskov',
+            'Donald Knuth', 'Margaret Hamilton', 'Dennis Ritchie', 'Ken Thompson', 'John McCarthy']
+GIF_TOPICS = ['potatoes', 'cats', 'dogs', 'rain', 'robots']
+STUB_GIF = b'GIF89a' + bytes(4096)
+
+# Commands for each functionality, they must be matched by the default regex
+def get_command(functionality, user_index, request_index):
+    if functionality is Functionality.SEND_FUNCTIONALITY:
+        return 'What can you do?'
+    if functionality is Functionality.SHOW_TIME:
+        return 'Show me the time'
+    if functionality is Functionality.SEARCH_PERSON_INFO:
+        return f'Who is {random.choice(PEOPLE)}?'
+    if functionality is Functionality.MAKE_FILE:
+        return f'Create file \'load/{user_index}/{request_index}.txt\' containing \'load test\''
+    if functionality is Functionality.MAKE_FILES:
+        return 'Create files ' + ', '.join(
+            f'\'load/{user_index}/{request_index}-{index}.txt\' containing \'load test\''
+            for index in range(5))
+    if functionality is Functionality.DOWNLOAD_GIFS:
+        return f'Download 3 gifs of {random.choice(GIF_TOPICS)}'
+    if functionality is Functionality.TELL_JOKE:
+        return random.choice(['Tell me a joke', 'Tell me a new joke'])
+    return 'exit'
+
+def check_commands(mix):
+    matcher = IntentMatcher([(row['regex'], row['functionality'], row.get('priority', 0))
+                                for row in get_default_functionality_regex()])
+    for functionality in list(mix) + [Functionality.SEND_EXIT]:
+        match = matcher.match(get_command(functionality, 0, 0))
+        if match is None or match[0] is not functionality:
+            raise ValueError(f'The command of {functionality.name} is not matched by its regex')
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[Functionality[name.strip().upper()]] = int(weight) if weight else 1
+    return mix
+
+# Agents that do not connect to an XMPP server, their messages are delivered by the container
+class LoopbackAgentMixin:
+    async def _async_start(self, auto_register=True):
+        await self.setup()
+        self._alive.set()
+        for behaviour in self.behaviours:
+            if not behaviour.is_running:
+                behaviour.set_agent(self)
+                behaviour.start()
+
+    async def _async_stop(self):
+        # Not connected, so the agent must not try to disconnect
+        self._alive.clear()
+        await super()._async_stop()
+
+class LoopbackChatbotAgent(LoopbackAgentMixin, ChatbotAgent):
+    pass
+
+class LoopbackDispatcherAgent(LoopbackAgentMixin, DispatcherAgent):
+    pass
+
+class LoadUserAgent(LoopbackAgentMixin, agent.Agent):
+    def __init__(self, jid, password, commands, results):
+        super().__init__(jid, password)
+        self.commands = commands
+        self.results = results
+        self.user_behaviour = None
+
+    async def setup(self):
+        self.user_behaviour = SendCommandsBehaviour()
+        self.add_behaviour(self.user_behaviour)
+
+class SendCommandsBehaviour(OneShotBehaviour):
+    async def request(self, body, language):
+        message = Message(to=CHATBOT_JID)
+        message.set_metadata('performative', 'request')
+        message.set_metadata('language', language)
+        message.thread = uuid.uuid4().hex
+        message.body = body
+        await self.send(message)
+        response = await self.receive(TIMEOUT_SECONDS)
+        if response is not None and response.thread != message.thread:
+            raise ValueError('Received a response to another request')
+        return response
+
+    async def run(self):
+        if await self.request('', 'chatbot-greeting') is None:
+            return
+        for functionality, command in self.agent.commands:
+            start = time.perf_counter()
+            response = await self.request(command, 'chatbot-query')
+            elapsed = time.perf_counter() - start
+            if response is None:
+                self.agent.results.timeouts[functionality] += 1
+                return
+            self.agent.results.latencies[functionality].append(elapsed)
+            if response.get_metadata('performative') == 'failure':
+                self.agent.results.failures[functionality] += 1
+
+class LoadResults:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.timeouts = defaultdict(int)
+
+# Wikipedia and Tenor, answering after a fixed latency in their own thread
+class StubServers:
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.loop = asyncio.new_event_loop()
+        self.runner = None
+        self.base_url = None
+
+    def start(self):
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get('/wiki', self.search_people)
+        app.router.add_get('/gifs', self.search_gifs)
+        app.router.add_get('/media/{name}', self.get_gif)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1] #  pylint: disable=protected-access
+        self.base_url = f'http://127.0.0.1:{port}'
+
+    async def search_people(self, request):
+        await asyncio.sleep(self.latency_seconds)
+        name = request.query['search']
+        paragraphs = ''.join(f'<p>{name} is mentioned in paragraph {index}.</p>'
+                                for index in range(50))
+        return web.Response(content_type='text/html', text=f'<html><body>' +
+            f'<div id="bodyContent"><div id="mw-content-text"><div class="mw-parser-output">' +
+            f'<p>{name} is a person who has been looked up during a load test.</p>' +
+            f'{paragraphs}</div></div></div></body></html>')
+
+    async def search_gifs(self, request):
+        await asyncio.sleep(self.latency_seconds)
+        query = request.query['q']
+        results = [{'id': f'{query}-{index}',
+                    'media': [{'gif': {'url': f'{self.base_url}/media/{query}-{index}.gif'}}]}
+                    for index in range(int(request.query['limit']))]
+        return web.json_response({'results': results})
+
+    async def get_gif(self, _):
+        await asyncio.sleep(self.latency_seconds)
+        return web.Response(body=STUB_GIF, content_type='image/gif')
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def print_report(results, users, elapsed):
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    print(f'{users} users, {total} requests in {elapsed:.2f} s: ' +
+            f'{total / elapsed:.1f} requests/s')
+    print(f'{"functionality":>20} {"requests":>9} {"failures":>9} {"timeouts":>9} ' +
+            f'{"p50 (ms)":>9} {"p95 (ms)":>9} {"p99 (ms)":>9}')
+    for functionality in Functionality:
+        latencies = sorted(results.latencies[functionality])
+        if not latencies and not results.timeouts[functionality]:
+            continue
+        percentiles = [f'{percentile(latencies, fraction) * 1e3:>9.1f}' if latencies
+                        else f'{"-":>9}' for fraction in (0.5, 0.95, 0.99)]
+        print(f'{functionality.name:>20} {len(latencies):>9} ' +
+                f'{results.failures[functionality]:>9} {results.timeouts[functionality]:>9} ' +
+                ' '.join(percentiles))
+
+# Without stubs, the default base URLs are kept
+def prepare_database(folder, stubs):
+    db.initialize_connection(f'sqlite:///{folder}/load_test.db')
+    db.seed_data()
+    if stubs is None:
+        la.load_answers_from_database()
+        return
+    with db.get_new_session() as session:
+        session.execute(update(BaseUrl).where(BaseUrl.id == 'SEARCH_PEOPLE_URL')
+                            .values(url=f'{stubs.base_url}/wiki'))
+        session.execute(update(BaseUrl).where(BaseUrl.id == 'SEARCH_GIFS_URL')
+                            .values(url=f'{stubs.base_url}/gifs'))
+        session.commit()
+    la.load_answers_from_database()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per user')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Weights of the functionality, e.g. SHOW_TIME=2,TELL_JOKE=1')
+    parser.add_argument('--stub-latency-ms', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='Apply the rate limit of the senders, rejected requests are failures')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Chatbot workers behind a dispatcher, none to use a single chatbot')
+    parser.add_argument('--balancing', default=DISPATCHER_BALANCING,
+                        choices=[BALANCING_LEAST_IN_FLIGHT, BALANCING_FUNCTIONALITY])
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument('--record', metavar='FOLDER',
+                        help='Use the real services and store their responses in the folder')
+    archive.add_argument('--replay', metavar='FOLDER',
+                        help='Answer with the responses stored in the folder')
+    parser.add_argument('--replay-latency-ms', type=float, default=0)
+    parser.add_argument('--replay-error-rate', type=float, default=0,
+                        help='Fraction of the replayed responses which fail')
+    args = parser.parse_args()
+    random.seed(args.seed)
+    check_commands(args.mix)
+
+    # The workers record to the same archive, which writes one response at a time
+    archive = HttpArchive(args.record) if args.record is not None else None
+    def make_transport():
+        if archive is not None:
+            return RecordingTransport(archive)
+        if args.replay is not None:
+            return ReplayTransport(args.replay, args.replay_latency_ms / 1e3,
+                                    args.replay_error_rate, seed=args.seed)
+        return None
+
+    stubs = None
+    if args.record is None and args.replay is None:
+        stubs = StubServers(args.stub_latency_ms / 1e3)
+        stubs.start()
+    with tempfile.TemporaryDirectory() as folder:
+        prepare_database(folder, stubs)
+        environment_folder = Path(folder) / 'environment'
+        environment_folder.mkdir()
+        api_keys_file = API_KEYS_FILE
+        if args.record is None:
+            # The API key is not part of the recorded requests
+            api_keys_file = Path(folder) / 'api_keys.json'
+            api_keys_file.write_text(json.dumps({'tenor.com': 'load-test'}), encoding='utf-8')
+
+        if args.workers > 0:
+            worker_jids = [f'worker{index}@loopback' for index in range(args.workers)]
+            dispatcher = LoopbackDispatcherAgent(CHATBOT_JID, 'password', worker_jids,
+                                                    balancing=args.balancing)
+            chatbots = [LoopbackChatbotAgent(worker_jid, 'password',
+                            api_keys_file=api_keys_file,
+                            environment_folder=str(environment_folder), metrics_port=None,
+                            dispatcher_jid=CHATBOT_JID, http_transport=make_transport())
+                        for worker_jid in worker_jids]
+        else:
+            dispatcher = None
+            chatbots = [LoopbackChatbotAgent(CHATBOT_JID, 'password', api_keys_file=api_keys_file,
+                            environment_folder=str(environment_folder), metrics_port=None,
+                            http_transport=make_transport())]
+        # The dispatcher goes first, so that it receives the first heartbeats
+        if dispatcher is not None:
+            if not args.rate_limit:
+                dispatcher.rate_limiter = RateLimiter(burst=float('inf'))
+            dispatcher.start().result()
+        for chatbot in chatbots:
+            if not args.rate_limit:
+                chatbot.rate_limiter = RateLimiter(burst=float('inf'))
+            chatbot.start().result()
+        while dispatcher is not None and dispatcher.count_healthy_workers() < args.workers:
+            time.sleep(0.01)
+
+        results = LoadResults()
+        functionality, weights = zip(*args.mix.items())
+        users = []
+        for user_index in range(args.users):
+            chosen = random.choices(functionality, weights, k=args.requests)
+            commands = [(choice, get_command(choice, user_index, request_index))
+                        for request_index, choice in enumerate(chosen)]
+            commands.append((Functionality.SEND_EXIT, get_command(Functionality.SEND_EXIT,
+                                                                    user_index, 0)))
+            users.append(LoadUserAgent(f'user{user_index}@loopback', 'password',
+                                        commands, results))
+
+        start = time.perf_counter()
+        for user in users:
+            user.start().result()
+        for user in users:
+            user.user_behaviour.join()
+        elapsed = time.perf_counter() - start
+
+        for user in users:
+            user.stop().result()
+        for chatbot in chatbots:
+            chatbot.stop().result()
+        if dispatcher is not None:
+            dispatcher.stop().result()
+        quit_spade()
+        if stubs is not None:
+            stubs.stop()
+        db.engine.dispose()
+    print_report(results, args.users, elapsed)
+
+if __name__ == '__main__':
+    main()
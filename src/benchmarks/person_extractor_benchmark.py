@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Compares the CPU time and the peak memory needed to extract the summary of a
+# Wikipedia article with extract_person_info against a full BeautifulSoup parse.
+# The saved pages of the fixtures folder are used, unless others are passed as arguments.
+# Larger synthetic articles are added with --synthetic.
+# Run from the src folder:
+# python3 -m benchmarks.person_extractor_benchmark [--synthetic] [article.html ...]
+#
+# tracemalloc only sees the memory allocated through Python, most of the memory
+# used by lxml is allocated by libxml2, so the peak RSS of the process is shown too
+
+import argparse
+import re
+import resource
+import time
+import tracemalloc
+from functools import reduce
+from pathlib import Path
+from bs4 import BeautifulSoup
+from app.person_extractor import extract_person_info
+from app.person_outcome import PersonOutcome
+
+REPEAT = 20
+FIXTURES_FOLDER = Path(__file__).parent / 'fixtures' / 'wikipedia'
+
+def get_fixture_pages():
+    return sorted(FIXTURES_FOLDER.glob('*.html'))
+
+# Implementation previous to extract_person_info, kept as the baseline
+def extract_person_info_soup(content):
+    html = BeautifulSoup(content, 'html.parser')
+    if html.find('div', {'id': 'disambigbox'}) is not None:
+        return PersonOutcome.AMBIGUOUS, None
+    content_text = html.find('div', {'id': 'mw-content-text'})
+    if content_text is None:
+        content = html.find('div', {'id': 'bodyContent'})
+        content_text = reduce(lambda x, y: x if len(x.text) > len(y.text) else y,
+                                content.children)
+    first_paragraph = next(filter(lambda x: len(x.text) > 5, content_text.find_all('p')), None)
+    if first_paragraph is not None:
+        match = re.match(r'The page \".*\" does not exist\. You can ask for it to be created',
+                            first_paragraph.text.strip())
+        if match is None:
+            return PersonOutcome.FOUND, re.sub(r'\[[^\[]*\]', '', first_paragraph.text).strip()
+    return PersonOutcome.NOT_FOUND, None
+
+def synthetic_article(name, sections, ambiguous=False, content_id='mw-content-text'):
+    navigation = ''.join(f'<li><a href="/wiki/Link_{i}">Link {i}</a></li>' for i in range(400))
+    infobox = ''.join(f'<tr><th>Field {i}</th><td>Value <a href="#">{i}</a>' +
+                        f'<sup class="reference">[{i}]</sup></td></tr>' for i in range(40))
+    paragraphs = ''.join(f'<h2>Section {s}</h2>' + ''.join(
+        f'<p>Paragraph {s}.{i} about <b>{name}</b> with a citation' +
+        f'<sup class="reference"><a href="#cite-{i}">[{i}]</a></sup> and more text.</p>'
+        for i in range(30)) for s in range(sections))
+    references = ''.join(f'<li id="cite-{i}">Reference {i}</li>' for i in range(300))
+    disambiguation = '<div id="disambigbox">Disambiguation</div>' if ambiguous else ''
+    return (f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>{name}</title>' +
+        '<style>.a{color:red}</style><script>var config = {};</script></head><body>' +
+        f'<div id="mw-navigation"><ul>{navigation}</ul></div>' +
+        '<div id="content"><div id="bodyContent">' +
+        f'<div id="{content_id}"><div class="mw-parser-output">' +
+        '<p class="mw-empty-elt"> </p>' +
+        f'<table class="infobox">{infobox}</table>' +
+        f'<p><b>{name}</b> (born 1961) is a person<sup>[1]</sup> known for things.[2]</p>' +
+        f'{paragraphs}<ol class="references">{references}</ol>{disambiguation}' +
+        '</div></div></div></div></body></html>').encode('utf-8')
+
+def measure(function, content):
+    start = time.process_time()
+    for _ in range(REPEAT):
+        result = function(content)
+    cpu_time = (time.process_time() - start) / REPEAT
+
+    # Tracing slows down the execution, so the memory is measured in a separate run
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cpu_time, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('articles', nargs='*', metavar='article.html',
+                        help='Instead of the saved pages of the fixtures folder')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Also measure synthetic articles of several sizes')
+    args = parser.parse_args()
+
+    paths = args.articles or get_fixture_pages()
+    articles = [(Path(path).name, Path(path).read_bytes()) for path in paths]
+    if args.synthetic:
+        articles += [('synthetic-small', synthetic_article('Jane Doe', 2)),
+                    ('synthetic-large', synthetic_article('John Doe', 40)),
+                    ('synthetic-ambiguous', synthetic_article('Doe', 5, ambiguous=True)),
+                    ('synthetic-fallback', synthetic_article('Foo', 5, content_id='other'))]
+
+    print(f'{"article":>20} {"size (KiB)":>10} {"soup (ms)":>10} {"lxml (ms)":>10} ' +
+            f'{"soup (KiB)":>11} {"lxml (KiB)":>11} {"same":>5}')
+    for name, content in articles:
+        soup_result, soup_time, soup_peak = measure(extract_person_info_soup, content)
+        lxml_result, lxml_time, lxml_peak = measure(extract_person_info, content)
+        print(f'{name[-20:]:>20} {len(content) / 1024:>10.0f} {soup_time * 1e3:>10.2f} ' +
+                f'{lxml_time * 1e3:>10.2f} {soup_peak / 1024:>11.0f} {lxml_peak / 1024:>11.0f} ' +
+                f'{str(soup_result == lxml_result):>5}')
+    print(f'Peak RSS of the process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} KiB')
+
+if __name__ == '__main__':
+    main()
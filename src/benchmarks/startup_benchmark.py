@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Measures the time spent preparing the database at startup, on the first boot and
+# on the following ones, with the seeding used before the seed versions were recorded
+# and with seed_data. A temporary SQLite database is used, unless a connection URL is
+# given. ALL THE TABLES OF THAT DATABASE ARE DROPPED, so --drop-existing must be given too.
+# Run from the src folder:
+# python3 -m benchmarks.startup_benchmark [--drop-existing connection_url]
+
+import argparse
+import tempfile
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from app.database import db, Answer, BaseUrl, FunctionalityRegex, Joke
+from app.database.default_data import get_answers, get_default_base_urls, \
+    get_default_functionality_regex, get_default_jokes
+
+WARM_BOOTS = 10
+
+# Seeding previous to seed_data, kept as the baseline
+def legacy_seed_data():
+    db.base.metadata.create_all(db.engine, checkfirst=True)
+    with db.get_new_session() as session:
+        for model, get_rows in ((BaseUrl, get_default_base_urls),
+                                (FunctionalityRegex, get_default_functionality_regex),
+                                (Answer, get_answers),
+                                (Joke, lambda: list(get_default_jokes()))):
+            try:
+                session.bulk_insert_mappings(model, get_rows())
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+
+def count_statements():
+    counter = {'statements': 0}
+    def before_cursor_execute(*_):
+        counter['statements'] += 1
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter, lambda: event.remove(db.engine, 'before_cursor_execute',
+                                        before_cursor_execute)
+
+def measure(seed):
+    counter, stop_counting = count_statements()
+    start = time.perf_counter()
+    seed()
+    elapsed = time.perf_counter() - start
+    stop_counting()
+    return elapsed, counter['statements']
+
+def boot_times(seed):
+    db.base.metadata.drop_all(db.engine)
+    cold_time, cold_statements = measure(seed)
+    warm = [measure(seed) for _ in range(WARM_BOOTS)]
+    warm_time = min(elapsed for elapsed, _ in warm)
+    return cold_time, cold_statements, warm_time, warm[-1][1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('connection_url', nargs='?',
+                        help='Instead of a temporary SQLite database')
+    parser.add_argument('--drop-existing', action='store_true',
+                        help='Allows dropping all the tables of the database of the URL')
+    args = parser.parse_args()
+    if args.connection_url is not None and not args.drop_existing:
+        parser.error('all the tables of the database are dropped, give --drop-existing ' +
+                        'to allow it')
+
+    if args.connection_url is not None:
+        run(args.connection_url)
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            run(f'sqlite:///{folder}/startup.db')
+
+def run(connection_url):
+    db.initialize_connection(connection_url)
+    print(f'{"seeding":>10} {"cold (ms)":>10} {"statements":>11} {"warm (ms)":>10} ' +
+            f'{"statements":>11}')
+    for name, seed in (('legacy', legacy_seed_data), ('versioned', db.seed_data)):
+        cold_time, cold_statements, warm_time, warm_statements = boot_times(seed)
+        print(f'{name:>10} {cold_time * 1e3:>10.1f} {cold_statements:>11} ' +
+                f'{warm_time * 1e3:>10.1f} {warm_statements:>11}')
+    db.base.metadata.drop_all(db.engine)
+    db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Imports jokes from text files, one joke per line, into the database of the chatbot.
+# The files are streamed in batches, so they can have millions of lines, and the jokes
+# repeated in the files or already in the database are skipped.
+# Usage: ./import_jokes.py [--batch-size N] [--database-url URL] <file> [<file> ...]
+# Files ending in .gz are decompressed. The database in the credentials is used by default
+
+import argparse
+import logging
+from sqlalchemy.exc import DatabaseError
+from app.const import APP_LOGGER_NAME, JOKE_IMPORT_BATCH_SIZE, MAIN_LOGGER_NAME, \
+    TRACEBACK_LOGGER_NAME
+from app.database import db
+from app.joke_importer import import_jokes
+from app.logging_setup import configure_logging
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(MAIN_LOGGER_NAME)
+traceback_logger = logger.getChild(TRACEBACK_LOGGER_NAME)
+
+def print_progress(stats):
+    print(f'{stats.read} read, {stats.duplicates} repeated, {stats.inserted} inserted, ' +
+            f'{stats.rows_per_second:.0f} rows/s')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', metavar='file')
+    parser.add_argument('--batch-size', type=int, default=JOKE_IMPORT_BATCH_SIZE)
+    parser.add_argument('--database-url', help='Instead of the one in the credentials')
+    args = parser.parse_args()
+    configure_logging()
+
+    try:
+        logger.debug('Connecting to the database')
+        db.initialize_connection(args.database_url)
+        db.seed_data()
+        logger.debug('Importing jokes from %s', ', '.join(args.files))
+        stats = import_jokes(db.engine, args.files, args.batch_size, on_batch=print_progress)
+    except (OSError, UnicodeDecodeError) as error:
+        print(f'Could not read the jokes: {error}')
+        traceback_logger.error('', exc_info=True)
+        return
+    except DatabaseError:
+        print('There was an error while writing to the database')
+        traceback_logger.error('', exc_info=True)
+        return
+
+    print(f'Imported {stats.inserted} jokes in {stats.seconds:.1f} s: ' +
+            f'{stats.read} read, {stats.duplicates} repeated in the files, ' +
+            f'{stats.read - stats.duplicates - stats.inserted} already in the database, ' +
+            f'{stats.rows_per_second:.0f} rows/s')
+
+if __name__=='__main__':
+    main()
@@ -2,49 +2,26 @@
 
 import json
 import logging
+import time
 from spade import quit_spade
 from sqlalchemy.exc import DatabaseError
 from app.chatbot_agent import ChatbotAgent
-from app.const import AGENT_CREDENTIALS_FILE, API_KEYS_FILE, DEFAULT_LOG_FILE, CHATBOT_LOG_FILE, \
-    APP_LOGGER_NAME, MAIN_LOGGER_NAME, CHATBOT_LOGGER_NAME, USER_LOGGER_NAME, TRACEBACK_LOGGER_NAME
+from app.const import AGENT_CREDENTIALS_FILE, API_KEYS_FILE, APP_LOGGER_NAME, MAIN_LOGGER_NAME, \
+    METRICS_PORT, TRACEBACK_LOGGER_NAME, WORKER_STARTUP_SECONDS
 from app.database import db
+from app.dispatcher_agent import DispatcherAgent
 from app.exceptions import InitFailedException
 from app.loaded_answers import loaded_answers as la
+from app.logging_setup import configure_logging
 from app.user_agent import UserAgent
 
 logger = logging.getLogger(APP_LOGGER_NAME).getChild(MAIN_LOGGER_NAME)
 traceback_logger = logger.getChild(TRACEBACK_LOGGER_NAME)
 
 def main():
-    # Configure library loggers
-    file_log_level = logging.DEBUG
-    logging.basicConfig(filename=DEFAULT_LOG_FILE,
-                            filemode='a',
-                            format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
-                            datefmt='%H:%M:%S',
-                            level=file_log_level)
-
-    # Configure app loggers
-    chatbot_logger = logging.getLogger(APP_LOGGER_NAME).getChild(CHATBOT_LOGGER_NAME)
-    user_logger = logging.getLogger(APP_LOGGER_NAME).getChild(USER_LOGGER_NAME)
-
-    # App logs go to a separate file
-    file_handler = logging.FileHandler(CHATBOT_LOG_FILE)
-    file_handler.setLevel(file_log_level)
-    formatter = logging.Formatter('%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s')
-    formatter.datefmt = '%H:%M:%S'
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    chatbot_logger.addHandler(file_handler)
-    user_logger.addHandler(file_handler)
-    traceback_logger.addHandler(file_handler)
-
-    # Additionally, log errors to the console, if they are from any of the child loggers
-    stream_handler = logging.StreamHandler()
-    stream_handler.setLevel(logging.ERROR)
-    logger.addHandler(stream_handler)
-    chatbot_logger.addHandler(stream_handler)
-    user_logger.addHandler(stream_handler)
+    # Library logs go to a file and app logs also to a separate one, written
+    # from a background thread
+    configure_logging()
 
     # Load the database
     try:
@@ -75,6 +52,9 @@ def main():
         creedentials['user']['password']
         creedentials['chatbot']['username']
         creedentials['chatbot']['password']
+        for worker in creedentials.get('workers', []):
+            worker['username']
+            worker['password']
         #  pylint: enable=pointless-statement
     except FileNotFoundError:
         logger.error('File with the credentials (%s) was not found', AGENT_CREDENTIALS_FILE)
@@ -92,9 +72,20 @@ def main():
         user = UserAgent(creedentials['user']['username'],
                             creedentials['user']['password'],
                             creedentials['chatbot']['username'])
-        chatbot = ChatbotAgent(creedentials['chatbot']['username'],
-                            creedentials['chatbot']['password'],
-                            creedentials['user']['username'])
+        # With workers, the chatbot address belongs to a dispatcher which forwards the
+        # requests to them. The workers which are not in process are run with worker.py
+        workers = []
+        if 'workers' in creedentials:
+            worker_jids = [worker['username'] for worker in creedentials['workers']]
+            chatbot = DispatcherAgent(creedentials['chatbot']['username'],
+                                creedentials['chatbot']['password'], worker_jids,
+                                metrics_port=METRICS_PORT)
+            workers = [ChatbotAgent(worker['username'], worker['password'], metrics_port=None,
+                                    dispatcher_jid=creedentials['chatbot']['username'])
+                        for worker in creedentials['workers'] if worker.get('in_process', True)]
+        else:
+            chatbot = ChatbotAgent(creedentials['chatbot']['username'],
+                                creedentials['chatbot']['password'])
     except FileNotFoundError:
         logger.error('File with the API keys (%s) was not found', AGENT_CREDENTIALS_FILE)
         traceback_logger.error('', exc_info=True)
@@ -116,8 +107,14 @@ def main():
     try:
         # Start the agents
         logger.debug('Starting agents agents')
-        user.start().result()
+        # The chatbot must be running before the user requests the greeting, and
+        # the dispatcher before its workers send their first heartbeat
         chatbot.start().result()
+        for worker in workers:
+            worker.start().result()
+        if 'workers' in creedentials:
+            wait_for_workers(chatbot)
+        user.start().result()
 
         # Wait until the execution is finished
         user.exit_behaviour.join()
@@ -136,6 +133,8 @@ def main():
     logger.debug('Stopping execution')
     user.stop()
     chatbot.stop()
+    for worker in workers:
+        worker.stop()
 
     quit_spade()
     print(la['AGENTS_FINISHED'])
@@ -145,5 +144,13 @@ def main():
     # is not viable, since SPADE has some issues with it)
     logging.disable()
 
+def wait_for_workers(dispatcher):
+    deadline = time.monotonic() + WORKER_STARTUP_SECONDS
+    while dispatcher.count_healthy_workers() == 0:
+        if time.monotonic() > deadline:
+            logger.warning('No worker is available yet')
+            return
+        time.sleep(0.1)
+
 if __name__=='__main__':
     main()
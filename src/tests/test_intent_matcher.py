@@ -0,0 +1,79 @@
+import re
+import unittest
+from app.database.default_data import get_default_functionality_examples, \
+    get_default_functionality_regex
+from app.intent_matcher import IntentMatcher
+
+# Patterns which the prefix index or the fused alternation could get wrong
+EDGE_PATTERNS = [
+    (r' hello\s*$', 'leading space'),
+    (r'\t\s*tabbed\s*$', 'leading tab'),
+    (r'(?i)bye\s*$', 'global flag'),
+    (r'(?x) ver \s+ bose $', 'verbose flag'),
+    (r'(?s)dot.all$', 'dotall flag'),
+    (r'^anchored\s*$', 'anchor'),
+    (r'[Cc]lass\s*$', 'class'),
+    (r'(?P<name>named)\s+group$', 'named group'),
+    (r'(ab)\1\s*$', 'group reference'),
+    (r'input\s+(\w+)$', 'dotless i'),
+    (r'sing\s*$', 'long s'),
+    (r'(?:say|tell)\s+(hi|bye)$', 'branch'),
+    (r'\s*(?:say)\s+hello$', 'shadowed'),
+    (r'.*anything$', 'no prefix'),
+]
+
+MESSAGES = [
+    ' hello', 'hello', '  hello', '\thello', ' HELLO ', '\t tabbed', 'tabbed', '\ttabbed',
+    'bye', ' BYE', 'verbose', 'ver  bose', 'dot\nall', 'DOT ALL', 'anchored', ' anchored',
+    'Class', 'class', 'CLASS', 'named group', 'NAMED  group', 'abab', 'ABab', 'abAB ',
+    'input word', 'İnput word', 'ınput word', 'sing', 'ſing', 'ſING',
+    'say hi', 'tell bye', 'say hello', 'ok, anything', '', '   ', 'who is', 'who is ?',
+    'tell me a joke\n', 'exit exit', 'download 3 gifs of', 'make files \'a\'',
+]
+
+# Tries every pattern in turn, as the matcher must behave
+def match_linearly(patterns, message):
+    for regex, functionality, _ in sorted(patterns, key=lambda pattern: -pattern[2]):
+        match = re.match(regex, message, re.I)
+        if match is not None:
+            return functionality, match.groups()
+    return None
+
+class IntentMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.default_patterns = [(row['regex'], row['functionality'], row.get('priority', 0))
+                                    for row in get_default_functionality_regex()]
+        self.messages = MESSAGES + [row['phrase'] for row in get_default_functionality_examples()]
+        self.messages += [f'  {message.upper()}  ' for message in self.messages]
+
+    def assert_same_as_linear(self, patterns):
+        matcher = IntentMatcher(patterns)
+        for message in self.messages:
+            with self.subTest(message=message):
+                self.assertEqual(matcher.match(message), match_linearly(patterns, message))
+
+    def test_default_patterns(self):
+        self.assert_same_as_linear(self.default_patterns)
+
+    def test_edge_patterns(self):
+        self.assert_same_as_linear([(regex, name, 0) for regex, name in EDGE_PATTERNS])
+
+    def test_edge_patterns_with_priorities(self):
+        patterns = self.default_patterns + [(regex, name, index % 3 - 1)
+                                            for index, (regex, name) in enumerate(EDGE_PATTERNS)]
+        self.assert_same_as_linear(patterns)
+
+    def test_each_edge_pattern_alone(self):
+        for regex, name in EDGE_PATTERNS:
+            with self.subTest(regex=regex):
+                self.assert_same_as_linear([(regex, name, 0)])
+
+    def test_spans(self):
+        matcher = IntentMatcher([(r'\s*say\s+(\w+)(?:\s+to\s+(\w+))?\s*$', 'say', 0)])
+        self.assertEqual(matcher.match_spans('say hi'), ('say', ('hi', None), [(4, 6), (-1, -1)]))
+        self.assertEqual(matcher.match_spans('  say hi to me'),
+                            ('say', ('hi', 'me'), [(6, 8), (12, 14)]))
+        self.assertIsNone(matcher.match_spans('hi'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import unittest.mock
+from app.person_extractor import extract_person_info
+from app.person_outcome import PersonOutcome
+from benchmarks.person_extractor_benchmark import FIXTURES_FOLDER, extract_person_info_soup, \
+    get_fixture_pages, synthetic_article
+
+EXPECTED_OUTCOMES = {
+    'ada_lovelace.html': PersonOutcome.FOUND,
+    'mercury_disambiguation.html': PersonOutcome.AMBIGUOUS,
+    'search_no_article.html': PersonOutcome.NOT_FOUND,
+}
+
+class PersonExtractorTest(unittest.TestCase):
+    def test_saved_pages(self):
+        self.assertEqual({path.name for path in get_fixture_pages()}, set(EXPECTED_OUTCOMES))
+        for path in get_fixture_pages():
+            with self.subTest(page=path.name):
+                content = path.read_bytes()
+                outcome, summary = extract_person_info(content)
+                self.assertEqual(outcome, EXPECTED_OUTCOMES[path.name])
+                self.assertEqual((outcome, summary), extract_person_info_soup(content))
+
+    def test_summary(self):
+        _, summary = extract_person_info((FIXTURES_FOLDER / 'ada_lovelace.html').read_bytes())
+        self.assertTrue(summary.startswith('Augusta Ada King, Countess of Lovelace (née Byron;'))
+        self.assertNotIn('[1]', summary)
+
+    def test_synthetic_articles(self):
+        for content in (synthetic_article('Jane Doe', 2),
+                        synthetic_article('Doe', 5, ambiguous=True),
+                        synthetic_article('Foo', 5, content_id='other')):
+            self.assertEqual(extract_person_info(content), extract_person_info_soup(content))
+
+    # The pages are fed to the parser in pieces, which may split scripts, styles or the
+    # first paragraph
+    def test_small_feeds(self):
+        for path in get_fixture_pages():
+            content = path.read_bytes()
+            expected = extract_person_info_soup(content)
+            for feed_size in range(16, 1024, 7):
+                with self.subTest(page=path.name, feed_size=feed_size):
+                    with unittest.mock.patch('app.person_extractor.FEED_SIZE', feed_size):
+                        self.assertEqual(extract_person_info(content), expected)
+
+if __name__ == '__main__':
+    unittest.main()
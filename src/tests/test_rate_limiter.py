@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+from app.rate_limiter import RateLimiter
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('app.rate_limiter.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst(self):
+        limiter = RateLimiter(tokens_per_second=1, burst=3)
+        self.assertEqual([limiter.try_acquire('a') for _ in range(4)], [True] * 3 + [False])
+        # Each sender has its own bucket
+        self.assertTrue(limiter.try_acquire('b'))
+
+    def test_refill(self):
+        limiter = RateLimiter(tokens_per_second=2, burst=3)
+        self.assertTrue(limiter.try_acquire('a', cost=3))
+        self.assertFalse(limiter.try_acquire('a'))
+        self.now += 0.5
+        self.assertTrue(limiter.try_acquire('a'))
+        self.assertFalse(limiter.try_acquire('a'))
+        # Never over the burst, however long the sender was idle
+        self.now += 3600
+        self.assertEqual([limiter.try_acquire('a') for _ in range(4)], [True] * 3 + [False])
+
+    def test_cost_over_burst_is_capped(self):
+        limiter = RateLimiter(tokens_per_second=1, burst=3)
+        self.assertTrue(limiter.try_acquire('a', cost=10))
+        self.assertFalse(limiter.try_acquire('a'))
+        self.now += 3
+        self.assertTrue(limiter.try_acquire('a', cost=10))
+
+    def test_bounded(self):
+        limiter = RateLimiter(tokens_per_second=1, burst=1, max_senders=2)
+        for key in ('a', 'b', 'c'):
+            self.assertTrue(limiter.try_acquire(key))
+        self.assertEqual(len(limiter), 2)
+        # The oldest bucket was dropped, so the sender starts with a full one
+        self.assertTrue(limiter.try_acquire('a'))
+        self.assertFalse(limiter.try_acquire('c'))
+
+    def test_used_buckets_are_kept(self):
+        limiter = RateLimiter(tokens_per_second=1, burst=1, max_senders=2)
+        limiter.try_acquire('a')
+        limiter.try_acquire('b')
+        limiter.try_acquire('a')
+        limiter.try_acquire('c')
+        self.assertFalse(limiter.try_acquire('a'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+from unittest import mock
+from app.sessions import SessionStore
+
+class FakeRequest:
+    def __init__(self):
+        self.finished = asyncio.Event()
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('app.sessions.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bounded(self):
+        sessions = SessionStore(max_sessions=3)
+        for jid in ('a', 'b', 'c', 'd', 'e'):
+            sessions.touch(jid)
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual([jid in sessions for jid in 'abcde'], [False] * 2 + [True] * 3)
+
+    def test_touch_keeps_recently_seen(self):
+        sessions = SessionStore(max_sessions=2)
+        sessions.touch('a')
+        sessions.touch('b')
+        sessions.touch('a')
+        sessions.touch('c')
+        self.assertIn('a', sessions)
+        self.assertNotIn('b', sessions)
+
+    def test_busy_sessions_are_not_evicted(self):
+        sessions = SessionStore(max_sessions=2)
+        request = FakeRequest()
+        sessions.touch('a').last_request = request
+        sessions.touch('b')
+        sessions.touch('c')
+        self.assertIn('a', sessions)
+        self.assertNotIn('b', sessions)
+
+        # Over the limit while every other session is busy
+        sessions.touch('c').last_request = FakeRequest()
+        sessions.touch('d')
+        self.assertEqual(len(sessions), 3)
+
+        # Back to the limit once they finish
+        request.finished.set()
+        sessions.touch('e')
+        self.assertEqual([jid in sessions for jid in 'acde'], [False, True, False, True])
+
+    def test_evict_idle(self):
+        sessions = SessionStore(idle_seconds=60)
+        sessions.touch('a')
+        sessions.touch('b').last_request = FakeRequest()
+        self.now += 30
+        sessions.touch('c')
+        self.now += 31
+        self.assertEqual(sessions.evict_idle(), 1)
+        self.assertNotIn('a', sessions)
+        # Idle too, but its request is still running
+        self.assertIn('b', sessions)
+        self.assertIn('c', sessions)
+        self.now += 30
+        self.assertEqual(sessions.evict_idle(), 1)
+        self.assertEqual(len(sessions), 1)
+
+    def test_touch_does_not_reset_last_request(self):
+        sessions = SessionStore()
+        request = FakeRequest()
+        sessions.touch('a').last_request = request
+        self.assertIs(sessions.touch('a').last_request, request)
+        sessions.remove('a')
+        self.assertIsNone(sessions.get('a'))
+
+if __name__ == '__main__':
+    unittest.main()
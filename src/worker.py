@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Runs one of the chatbot workers of agent_credentials.json in its own process, for the
+# dispatcher started by main.py. Usage: ./worker.py <index of the worker>
+
+import json
+import logging
+import sys
+import time
+from spade import quit_spade
+from sqlalchemy.exc import DatabaseError
+from app.chatbot_agent import ChatbotAgent
+from app.const import AGENT_CREDENTIALS_FILE, APP_LOGGER_NAME, MAIN_LOGGER_NAME, METRICS_PORT, \
+    TRACEBACK_LOGGER_NAME, WORKER_CHATBOT_LOG_FILE_F, WORKER_LOG_FILE_F
+from app.database import db
+from app.exceptions import InitFailedException
+from app.loaded_answers import loaded_answers as la
+from app.logging_setup import configure_logging
+
+logger = logging.getLogger(APP_LOGGER_NAME).getChild(MAIN_LOGGER_NAME)
+traceback_logger = logger.getChild(TRACEBACK_LOGGER_NAME)
+
+def main():
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        print(f'Usage: {sys.argv[0]} <index of the worker>')
+        return
+    index = int(sys.argv[1])
+    configure_logging(log_file=WORKER_LOG_FILE_F.format(index=index),
+                        app_log_file=WORKER_CHATBOT_LOG_FILE_F.format(index=index))
+
+    try:
+        logger.debug('Loading agent credentials')
+        with open(AGENT_CREDENTIALS_FILE, 'r', encoding='utf8') as creedentials_file:
+            creedentials = json.load(creedentials_file)
+        dispatcher_jid = creedentials['chatbot']['username']
+        username = creedentials['workers'][index]['username']
+        password = creedentials['workers'][index]['password']
+    except FileNotFoundError:
+        logger.error('File with the credentials (%s) was not found', AGENT_CREDENTIALS_FILE)
+        traceback_logger.error('', exc_info=True)
+        return
+    except (json.decoder.JSONDecodeError, KeyError, IndexError):
+        logger.error('File with the credentials (%s) does not have worker %d \
+(see the sample file)', AGENT_CREDENTIALS_FILE, index)
+        traceback_logger.error('', exc_info=True)
+        return
+
+    # The main process seeds the database
+    try:
+        logger.debug('Connecting to the database')
+        db.initialize_connection()
+        logger.debug('Loading Answers from the database')
+        la.load_answers_from_database()
+        chatbot = ChatbotAgent(username, password, metrics_port=METRICS_PORT + 1 + index,
+                                dispatcher_jid=dispatcher_jid)
+    except DatabaseError:
+        logger.error('There was an error while connecting to the database')
+        traceback_logger.error('', exc_info=True)
+        return
+    except InitFailedException:
+        logger.error('Base URLs could not be loaded from the database')
+        traceback_logger.error('', exc_info=True)
+        return
+
+    try:
+        logger.debug('Starting worker %d', index)
+        chatbot.start().result()
+        while chatbot.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print()
+
+    logger.debug('Stopping worker %d', index)
+    chatbot.stop().result()
+    quit_spade()
+    logging.disable()
+
+if __name__=='__main__':
+    main()